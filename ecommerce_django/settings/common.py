@@ -141,6 +141,43 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
 }
 
+CACHES = {
+    # Small per-process LRU in front of the shared Redis cache. Version
+    # counters are read from Redis every time so bumps are seen at once.
+    'default': {
+        'BACKEND': 'store.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'L2_CACHE': 'redis',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'STALE_TIMEOUT': 60,
+            'L1_EXCLUDE': ['store:version:'],
+        }
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://redis:6379/1'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        }
+    }
+}
+
+# Product and collection responses are cached under versioned keys that
+# are bumped on every write, so they can be kept around for a long time.
+STORE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Render product list/retrieve from values() rows instead of model instances
+STORE_PRODUCT_VALUES_SERIALIZER = True
+
+# Rows (creates, updates and deletes) one products/batch/ request may carry
+STORE_PRODUCT_BATCH_MAX_ROWS = 1000
+
+# Anonymous carts live in Redis until checkout, expiring a week after their
+# last change. 'store.carts.DatabaseCartStore' keeps them in the database.
+STORE_CART_STORE = 'store.carts.RedisCartStore'
+STORE_CART_TTL = 7 * 24 * 60 * 60
+
 
 LOGGING = {
     'version': 1,
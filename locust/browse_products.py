@@ -17,6 +17,12 @@ class StoreVisitor(HttpUser):
         self.client.get(
             f'/store/products/{product_id}/', name='/store/product/:id')
 
+    @task(3)
+    def view_cart_products(self):
+        product_ids = ','.join(str(randint(3, 1000)) for _ in range(5))
+        self.client.get(
+            f'/store/products/?ids={product_ids}', name='/store/products?ids')
+
     @task(2)
     def add_to_cart(self):
         product_id = randint(3, 10)
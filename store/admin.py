@@ -3,7 +3,10 @@ from django.contrib import admin, messages
 from django.db.models.aggregates import Count
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
-from .models import Product, Collection, Customer, Order, ProductImage
+from .models import Product, Collection, Customer, Order, OutboxEvent, IdempotencyKey, ProductImage, \
+    ProductSalesDay, CollectionSalesDay, CustomerSales
+from .search import search_products
+from .facets import INVENTORY_BANDS
 
 
 class InventoryFilter(admin.SimpleListFilter):
@@ -11,19 +14,12 @@ class InventoryFilter(admin.SimpleListFilter):
     parameter_name = 'quantity'
 
     def lookups(self, request, model_admin):
-        return [
-            ('<10', 'Low'),
-            ('<50', 'Mid'),
-            ('>50', 'Good')
-        ]
+        return [(value, label) for value, label, _ in INVENTORY_BANDS]
 
     def queryset(self, request, queryset: QuerySet):
-        if self.value() == '<10':
-            return queryset.filter(quantity__lt=10)
-        elif self.value() == '<50':
-            return queryset.filter(quantity__gt=10).filter(quantity__lt=50)
-        elif self.value() == '>50':
-            return queryset.filter(quantity__gt=50)
+        for value, _, condition in INVENTORY_BANDS:
+            if self.value() == value:
+                return queryset.filter(condition)
 
 
 class ProductImageInline(admin.TabularInline):
@@ -49,6 +45,11 @@ class ProductAdmin(admin.ModelAdmin):
         'slug': ['title']
     }
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_products(queryset, search_term), False
+
     @admin.display(ordering='quantity')
     def inventory_status(self, product):
         if product.quantity < 10:
@@ -72,15 +73,6 @@ class CollectionAdmin(admin.ModelAdmin):
     list_display = ['name', 'products_count']
     search_fields = ['name']
 
-    def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        return super().get_queryset(request).annotate(
-            products_count=Count('product')
-        )
-
-    @admin.display(ordering='products_count')
-    def products_count(self, collection):
-        return collection.products_count
-
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
@@ -117,3 +109,50 @@ class OrderAdmin(admin.ModelAdmin):
     @admin.display()
     def username(self, order):
         return order.customer.user.username
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'topic', 'attempts', 'created_at', 'available_at', 'dispatched_at']
+    list_filter = ['topic', ('dispatched_at', admin.EmptyFieldListFilter)]
+    readonly_fields = ['topic', 'payload', 'created_at', 'attempts', 'last_error', 'dispatched_at']
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'user', 'response_status', 'created_at']
+    list_select_related = ['user']
+    search_fields = ['key']
+    readonly_fields = ['user', 'key', 'request_hash', 'response_status', 'response_body', 'created_at']
+
+
+class SalesRollupAdmin(admin.ModelAdmin):
+    list_filter = ['payment_status']
+    list_per_page = 100
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductSalesDay)
+class ProductSalesDayAdmin(SalesRollupAdmin):
+    list_display = ['day', 'product', 'payment_status', 'units', 'revenue']
+    list_select_related = ['product']
+    date_hierarchy = 'day'
+
+
+@admin.register(CollectionSalesDay)
+class CollectionSalesDayAdmin(SalesRollupAdmin):
+    list_display = ['day', 'collection', 'payment_status', 'units', 'revenue']
+    list_select_related = ['collection']
+    date_hierarchy = 'day'
+
+
+@admin.register(CustomerSales)
+class CustomerSalesAdmin(SalesRollupAdmin):
+    list_display = ['customer', 'payment_status', 'orders', 'revenue']
+    list_select_related = ['customer__user']
+    ordering = ['-revenue']
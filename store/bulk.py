@@ -0,0 +1,220 @@
+from collections import Counter, defaultdict
+from django.db import connection, transaction, DatabaseError
+from django.utils import timezone
+from django.utils.text import slugify
+from . import cache, counters, pricing
+from .models import Product, Collection, Promotion
+from .serializers import ProductRowSerializer
+
+EXPORT_FIELDS = ['id', 'title', 'slug', 'description',
+                 'unit_price', 'quantity', 'collection', 'promotion']
+
+UPDATE_FIELDS = ['title', 'slug', 'description', 'unit_price',
+                 'quantity', 'collection', 'last_update']
+
+
+def export_products(chunk_size=2000):
+    """Yield every product as a dict, reading `chunk_size` rows at a time."""
+    products = Product.objects.order_by('pk').prefetch_related(
+        'promotion').iterator(chunk_size=chunk_size)
+    for product in products:
+        yield {
+            'id': product.id,
+            'title': product.title,
+            'slug': product.slug,
+            'description': product.description,
+            'unit_price': product.unit_price,
+            'quantity': product.quantity,
+            'collection': product.collection_id,
+            'promotion': [promotion.id for promotion in product.promotion.all()],
+        }
+
+
+def insert_products(products):
+    """
+    `bulk_create` the products and set the ids the database gave them.
+
+    MySQL doesn't return the ids of bulk inserted rows. Django inserts the
+    products without an id in one statement, and InnoDB hands a multi-row
+    insert of a known size one range of ids, starting at `LAST_INSERT_ID()`
+    and spaced by `auto_increment_increment`.
+    """
+    new_products = [product for product in products if product.pk is None]
+    Product.objects.bulk_create(products)
+    if connection.features.can_return_rows_from_bulk_insert or not new_products:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT LAST_INSERT_ID(), @@auto_increment_increment')
+        first, step = cursor.fetchone()
+    for offset, product in enumerate(new_products):
+        product.pk = first + offset * step
+
+
+def save_products(creates, updates):
+    """
+    Write products with one `bulk_create` and a `bulk_update` per set of
+    updated columns.
+
+    `creates` are (product, promotion ids) pairs and `updates` are
+    (product, promotion ids, fields) triples, where promotion ids of None
+    leave the product's promotions untouched and only `fields` of an
+    updated product are written. Bulk writes skip the model signals, so
+    the product caches are invalidated and the collection counts of new
+    products raised here; `ProductQuerySet.update` moves the counts of
+    updated ones.
+    """
+    with transaction.atomic():
+        new_products = [product for product, _ in creates]
+        insert_products(new_products)
+        counters.adjust_products_count(
+            Counter(product.collection_id for product in new_products))
+
+        now = timezone.now()
+        by_fields = defaultdict(list)
+        for product, _, fields in updates:
+            product.last_update = now
+            by_fields[tuple(fields)].append(product)
+        for fields, products in by_fields.items():
+            Product.objects.bulk_update(products, fields)
+
+        links = [(product, promotions) for product, promotions, *_ in creates + updates
+                 if promotions is not None]
+        through = Product.promotion.through
+        through.objects.filter(
+            product_id__in=[product.pk for product, _ in links]).delete()
+        through.objects.bulk_create([
+            through(product_id=product.pk, promotion_id=promotion_id)
+            for product, promotions in links for promotion_id in promotions
+        ])
+        # Updated prices were refreshed by `ProductQuerySet.update` already
+        repriced = [product.pk for product, _ in creates] + [
+            product.pk for product, promotions, _ in updates if promotions is not None]
+        pricing.refresh_effective_prices(Product.objects.filter(pk__in=repriced))
+
+    cache.bump(cache.PRODUCTS, cache.COLLECTIONS, cache.CATALOG)
+
+
+def get_row_context():
+    """Context for `ProductRowSerializer`: the ids rows may refer to."""
+    return {
+        'collection_ids': set(Collection.objects.values_list('id', flat=True)),
+        'promotion_ids': set(Promotion.objects.values_list('id', flat=True)),
+    }
+
+
+def build_product(data):
+    """Return an unsaved product and its promotion ids from validated data."""
+    data = dict(data)
+    promotions = data.pop('promotion', None)
+    product = Product(collection_id=data.pop('collection'), **data)
+    if not product.slug:
+        product.slug = slugify(product.title)
+    return product, promotions
+
+
+def build_update(data):
+    """
+    Return `build_product(data)` and the columns to write: the ones in
+    `data`, so a row leaves the fields it omits as they are.
+    """
+    product, promotions = build_product(data)
+    return product, promotions, [field for field in UPDATE_FIELDS
+                                 if field in data or field == 'last_update']
+
+
+def write_product_batch(create=(), update=(), delete=()):
+    """
+    Apply a batch of creates, updates and deletes in one transaction.
+
+    Raises `ProtectedError` if a deleted product is referenced by orders.
+    """
+    with transaction.atomic(), cache.batch_invalidation(), counters.batch_products_count():
+        creates = [build_product(data) for data in create]
+        updates = [build_update(data) for data in update]
+        save_products(creates, updates)
+        Product.objects.filter(pk__in=delete).delete()
+
+    return {
+        'created': [product.pk for product, _ in creates],
+        'updated': [product.pk for product, *_ in updates],
+        'deleted': list(delete),
+    }
+
+
+class ProductImporter:
+    """
+    Import products from an iterable of rows in batches.
+
+    Rows with the id of an existing product update it, other rows create
+    a product. Invalid rows are reported by their 1-based position and
+    never abort the rest of the import.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.context = get_row_context()
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    @property
+    def report(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'errors': self.errors,
+        }
+
+    def run(self, rows):
+        batch = []
+        for line, row in enumerate(rows, start=1):
+            if isinstance(row, Exception):
+                self.errors.append({'row': line, 'errors': {'non_field_errors': [str(row)]}})
+                continue
+            serializer = ProductRowSerializer(data=row, context=self.context)
+            if not serializer.is_valid():
+                self.errors.append({'row': line, 'errors': serializer.errors})
+                continue
+            batch.append((line, serializer.validated_data))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+        return self.report
+
+    def flush(self, batch):
+        if not batch:
+            return
+        ids = {data['id'] for _, data in batch if data.get('id')}
+        existing = set(Product.objects.filter(
+            pk__in=ids).values_list('pk', flat=True))
+
+        creates, updates = [], []
+        for line, data in batch:
+            if data.get('id') in existing:
+                updates.append((line, build_update(data)))
+            else:
+                creates.append((line, build_product(data)))
+
+        try:
+            save_products([item for _, item in creates], [item for _, item in updates])
+        except DatabaseError:
+            # Find the offending rows by writing them one at a time, dropping
+            # the ids the failed bulk insert may have handed out.
+            for line, (product, promotions) in creates:
+                if product.pk not in ids:
+                    product.pk = None
+                self.save_row(line, [(product, promotions)], [])
+            for line, item in updates:
+                self.save_row(line, [], [item])
+        else:
+            self.created += len(creates)
+            self.updated += len(updates)
+
+    def save_row(self, line, creates, updates):
+        try:
+            save_products(creates, updates)
+            self.created += len(creates)
+            self.updated += len(updates)
+        except DatabaseError as error:
+            self.errors.append({'row': line, 'errors': {'non_field_errors': [str(error)]}})
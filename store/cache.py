@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework.response import Response
+
+# Namespaces whose version is part of every cache key built from them.
+# Bumping a namespace orphans all entries built from its previous version.
+PRODUCTS = 'products'
+COLLECTIONS = 'collections'
+CATALOG = 'catalog'
+
+VERSION_KEY = 'store:version:{}'
+
+_batch = threading.local()
+
+
+def product_namespace(pk):
+    return f'product:{pk}'
+
+
+def cart_namespace(pk):
+    return f'cart:{pk}'
+
+
+def get_timeout():
+    return getattr(settings, 'STORE_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def get_version_timeout(namespace):
+    # Per-cart versions expire like the carts, instead of piling up forever.
+    # One that expires early is reseeded from the clock, which only orphans
+    # the entries built from it.
+    if namespace.startswith(cart_namespace('')):
+        return getattr(settings, 'STORE_CART_TTL', 7 * 24 * 60 * 60)
+    return None
+
+
+def _initial_version():
+    # Seeding from the clock means a version key that was evicted never
+    # comes back with a value an older entry was built from.
+    return int(time.time() * 1000)
+
+
+def get_versions(*namespaces):
+    keys = {VERSION_KEY.format(namespace): namespace for namespace in namespaces}
+    versions = cache.get_many(list(keys))
+    for key in keys.keys() - versions.keys():
+        cache.add(key, _initial_version(), get_version_timeout(keys[key]))
+        versions[key] = cache.get(key)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def _bump(namespaces):
+    for namespace in namespaces:
+        key = VERSION_KEY.format(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), get_version_timeout(namespace))
+
+
+def bump(*namespaces):
+    """
+    Invalidate every entry built from the given namespaces.
+
+    Inside a transaction the versions are bumped again on commit, so a
+    reader can't cache the old rows under the new version in between.
+    """
+    pending = getattr(_batch, 'pending', None)
+    if pending is not None:
+        pending.update(namespaces)
+        return
+    _bump(namespaces)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(namespaces))
+
+
+@contextmanager
+def batch_invalidation():
+    """
+    Collect the bumps made inside the block and apply them once on exit.
+
+    Per-product namespaces are folded into `CATALOG` when more than one
+    product changed, so a batch costs a handful of cache writes.
+    """
+    if getattr(_batch, 'pending', None) is not None:
+        yield
+        return
+
+    _batch.pending = set()
+    try:
+        yield
+    finally:
+        namespaces, _batch.pending = _batch.pending, None
+        products = {namespace for namespace in namespaces
+                    if namespace.startswith(product_namespace(''))}
+        if len(products) > 1:
+            namespaces = (namespaces - products) | {CATALOG}
+        if namespaces:
+            bump(*namespaces)
+
+
+def make_key(name, namespaces, *parts):
+    return make_keys(name, [namespaces], *parts)[0]
+
+
+def make_keys(name, namespace_groups, *parts):
+    """Build one key per group of namespaces, reading all versions at once."""
+    versions = get_versions(*{namespace for group in namespace_groups for namespace in group})
+    digest = hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+    return [
+        f"store:{name}:{'.'.join(str(versions[namespace]) for namespace in group)}:{digest}"
+        for group in namespace_groups
+    ]
+
+
+def request_fingerprint(request):
+    # Pagination links are absolute, so the host is part of the entry.
+    query = sorted(request.query_params.lists())
+    return f'{request.build_absolute_uri(request.path)}?{query}'
+
+
+class VersionedCacheMixin:
+    """
+    Cache `list` and `retrieve` responses under versioned keys.
+
+    Entries are never stale: writes to the underlying models bump the
+    namespaces returned by `get_cache_namespaces`, see `store.signals`.
+    """
+
+    def get_cache_namespaces(self):
+        raise NotImplementedError
+
+    def cached_response(self, action, request, *args, **kwargs):
+        key = make_key(f'{self.basename}-{self.action}',
+                       self.get_cache_namespaces(),
+                       request_fingerprint(request))
+        data = cache.get_or_set(
+            key, lambda: action(request, *args, **kwargs).data, get_timeout())
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
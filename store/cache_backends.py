@@ -0,0 +1,343 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.db import connections
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class _Entry:
+    """
+    L2 envelope carrying the time after which the value is stale.
+
+    Stale entries are kept in L2 for `STALE_TIMEOUT` more seconds so
+    `get_or_set` can serve them while a single caller refreshes the key.
+    """
+    __slots__ = ('value', 'fresh_until')
+
+    def __init__(self, value, fresh_until):
+        self.value = value
+        self.fresh_until = fresh_until
+
+    def __reduce__(self):
+        return (_Entry, (self.value, self.fresh_until))
+
+    @property
+    def is_stale(self):
+        return self.fresh_until is not None and self.fresh_until <= time.time()
+
+
+class _Flight:
+    __slots__ = ('event', 'value', 'done')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.done = False
+
+
+class _ProcessState:
+    """The L1 entries and in-flight loads shared by a process's instances."""
+    __slots__ = ('l1', 'l1_lock', 'flights', 'flights_lock')
+
+    def __init__(self):
+        self.l1 = OrderedDict()
+        self.l1_lock = threading.Lock()
+        self.flights = {}
+        self.flights_lock = threading.Lock()
+
+
+# Django creates a backend instance per thread, so like `LocMemCache` the
+# state lives here, keyed by the alias's LOCATION
+_states = {}
+_states_lock = threading.Lock()
+
+
+def _get_state(name):
+    with _states_lock:
+        if name not in _states:
+            _states[name] = _ProcessState()
+        return _states[name]
+
+
+class TwoTierCache(BaseCache):
+    """
+    A bounded per-process LRU (L1) in front of a shared cache alias (L2).
+
+    L1 entries live for at most `L1_TIMEOUT` seconds, so a delete issued by
+    another process is seen within that window. Keys starting with one of
+    the `L1_EXCLUDE` prefixes (e.g. counters updated with `incr`) always go
+    to L2 and are stored as-is, never served stale. `get_or_set` coalesces
+    concurrent misses on the same key, both between threads of this process
+    and, through an L2 lock key, between processes, and serves stale values
+    while a single caller revalidates. Instances with the same LOCATION,
+    e.g. the ones Django creates for each thread, share L1 and the
+    in-flight loads.
+
+    OPTIONS:
+        L2_CACHE: alias of the shared cache, usually django-redis.
+        L1_MAX_ENTRIES, L1_TIMEOUT: size and TTL of the local tier.
+        STALE_TIMEOUT: how long expired values may still be served.
+        LOCK_TIMEOUT: how long to wait for another caller's refresh.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2_CACHE', 'redis')
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._stale_timeout = int(options.get('STALE_TIMEOUT', 60))
+        self._lock_timeout = float(options.get('LOCK_TIMEOUT', 10))
+        self._poll_interval = float(options.get('POLL_INTERVAL', 0.05))
+        self._l1_exclude = tuple(options.get('L1_EXCLUDE', ()))
+        state = _get_state(location or '')
+        self._l1 = state.l1
+        self._l1_lock = state.l1_lock
+        self._flights = state.flights
+        self._flights_lock = state.flights_lock
+
+    @cached_property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # L1
+
+    def _l1_get(self, key):
+        with self._l1_lock:
+            item = self._l1.get(key, _MISSING)
+            if item is _MISSING:
+                return _MISSING
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._l1[key]
+                return _MISSING
+            self._l1.move_to_end(key)
+            return value
+
+    def _is_excluded(self, raw_key):
+        return bool(self._l1_exclude) and raw_key.startswith(self._l1_exclude)
+
+    def _l1_set(self, raw_key, key, entry):
+        if self._is_excluded(raw_key):
+            return
+        ttl = self._l1_timeout
+        if entry.fresh_until is not None:
+            ttl = min(ttl, entry.fresh_until - time.time())
+        if ttl <= 0:
+            return
+        with self._l1_lock:
+            self._l1[key] = (entry.value, time.monotonic() + ttl)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._l1_lock:
+            self._l1.pop(key, None)
+
+    # L2
+
+    def _wrap(self, key, value, timeout):
+        """
+        Return the L2 payload, L2 timeout and remaining lifetime of a value.
+
+        Values without an expiry and excluded keys are stored as-is, so L2
+        `incr` keeps working on counters, expiring ones included.
+        """
+        expiry = self.get_backend_timeout(timeout)
+        if expiry is None:
+            return value, None, None
+        remaining = expiry - time.time()
+        if self._is_excluded(key):
+            return value, remaining, remaining
+        return _Entry(value, expiry), remaining + self._stale_timeout, remaining
+
+    def _unwrap(self, payload):
+        if isinstance(payload, _Entry):
+            return payload
+        return _Entry(payload, None)
+
+    def _l2_get(self, key, version):
+        payload = self.l2.get(key, _MISSING, version=version)
+        if payload is _MISSING:
+            return None
+        return self._unwrap(payload)
+
+    # BaseCache API
+
+    def get(self, key, default=None, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        value = self._l1_get(cache_key)
+        if value is not _MISSING:
+            return value
+        entry = self._l2_get(key, version)
+        if entry is None or entry.is_stale:
+            return default
+        self._l1_set(key, cache_key, entry)
+        return entry.value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        payload, l2_timeout, remaining = self._wrap(key, value, timeout)
+        if remaining is not None and remaining <= 0:
+            # A zero or negative timeout means "expire now"
+            self.delete(key, version=version)
+            return
+        self.l2.set(key, payload, l2_timeout, version=version)
+        self._l1_set(key, cache_key, self._unwrap(payload))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        payload, l2_timeout, _ = self._wrap(key, value, timeout)
+        added = self.l2.add(key, payload, l2_timeout, version=version)
+        if added:
+            self._l1_set(key, cache_key, self._unwrap(payload))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        self._l1_delete(cache_key)
+        entry = self._l2_get(key, version)
+        if entry is None:
+            return False
+        self.set(key, entry.value, timeout, version=version)
+        return True
+
+    def delete(self, key, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        self._l1_delete(cache_key)
+        return self.l2.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def incr(self, key, delta=1, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        self._l1_delete(cache_key)
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        pending = []
+        for key in keys:
+            value = self._l1_get(self.make_and_validate_key(key, version=version))
+            if value is _MISSING:
+                pending.append(key)
+            else:
+                found[key] = value
+        if pending:
+            for key, payload in self.l2.get_many(pending, version=version).items():
+                entry = self._unwrap(payload)
+                if entry.is_stale:
+                    continue
+                self._l1_set(key, self.make_key(key, version=version), entry)
+                found[key] = entry.value
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version=version)
+        return []
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_and_validate_key(key, version=version))
+        self.l2.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._l1_lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+    # Stampede protection
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        value = self._l1_get(cache_key)
+        if value is not _MISSING:
+            return value
+
+        entry = self._l2_get(key, version)
+        if entry is not None:
+            self._l1_set(key, cache_key, entry)
+            if entry.is_stale:
+                self._revalidate(key, default, timeout, version)
+            return entry.value
+
+        with self._flights_lock:
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = _Flight()
+
+        if not leader:
+            flight.event.wait(self._lock_timeout)
+            if flight.done:
+                return flight.value
+            return self._compute(key, default, timeout, version)
+
+        try:
+            flight.value = self._fill(key, default, timeout, version)
+            flight.done = True
+            return flight.value
+        finally:
+            flight.event.set()
+            with self._flights_lock:
+                del self._flights[cache_key]
+
+    def _lock_key(self, key):
+        return f'{key}:lock'
+
+    def _compute(self, key, default, timeout, version):
+        value = default() if callable(default) else default
+        if value is not None:
+            self.set(key, value, timeout, version=version)
+        return value
+
+    def _fill(self, key, default, timeout, version):
+        lock_key = self._lock_key(key)
+        if self.l2.add(lock_key, 1, self._lock_timeout, version=version):
+            try:
+                return self._compute(key, default, timeout, version)
+            finally:
+                self.l2.delete(lock_key, version=version)
+
+        # Another process holds the lock, wait for it to publish the value
+        deadline = time.monotonic() + self._lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self._poll_interval)
+            entry = self._l2_get(key, version)
+            if entry is not None:
+                return entry.value
+        return self._compute(key, default, timeout, version)
+
+    def _revalidate(self, key, default, timeout, version):
+        lock_key = self._lock_key(key)
+        if not self.l2.add(lock_key, 1, self._lock_timeout, version=version):
+            return
+
+        def refresh():
+            try:
+                self._compute(key, default, timeout, version)
+            except Exception:
+                logger.exception('Failed to revalidate cache key %s', key)
+            finally:
+                self.l2.delete(lock_key, version=version)
+                # The callable may have queried, and this thread's
+                # connections would otherwise stay open
+                connections.close_all()
+
+        threading.Thread(target=refresh, daemon=True).start()
@@ -0,0 +1,431 @@
+from datetime import datetime
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, Prefetch
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from .cache import PRODUCTS, bump, cart_namespace, get_timeout, make_key
+from .models import Cart, CartItem, Product
+
+_store = None
+
+# Adds to the quantity when (product, cart) already exists. The row is
+# selected from the cart, so nothing is written when the cart is missing.
+UPSERT_SQL = {
+    'sqlite': """
+        INSERT INTO {table} (cart_id, product_id, quantity)
+        SELECT id, %s, %s FROM {cart_table} WHERE id = %s
+        ON CONFLICT (product_id, cart_id) DO UPDATE SET quantity = quantity + excluded.quantity
+        RETURNING id, quantity
+    """,
+    'postgresql': """
+        INSERT INTO {table} (cart_id, product_id, quantity)
+        SELECT id, %s, %s FROM {cart_table} WHERE id = %s
+        ON CONFLICT (product_id, cart_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity
+        RETURNING id, quantity
+    """,
+    # The row alias replaces the deprecated VALUES(), and an INSERT ... SELECT
+    # can only name the selected row through a derived table
+    'mysql': """
+        INSERT INTO {table} (cart_id, product_id, quantity)
+        SELECT * FROM (
+            SELECT id AS cart_id, %s AS product_id, %s AS quantity
+            FROM {cart_table} WHERE id = %s
+        ) AS new
+        ON DUPLICATE KEY UPDATE
+            {table}.id = LAST_INSERT_ID({table}.id),
+            {table}.quantity = {table}.quantity + new.quantity
+    """,
+}
+
+# Many rows at once: `(statement, quantity when adding, quantity when replacing)`
+BULK_UPSERT_SQL = {
+    'sqlite': (
+        'INSERT INTO {table} (cart_id, product_id, quantity) VALUES {rows} '
+        'ON CONFLICT (product_id, cart_id) DO UPDATE SET quantity = {quantity}',
+        '{table}.quantity + excluded.quantity', 'excluded.quantity'),
+    'postgresql': (
+        'INSERT INTO {table} (cart_id, product_id, quantity) VALUES {rows} '
+        'ON CONFLICT (product_id, cart_id) DO UPDATE SET quantity = {quantity}',
+        '{table}.quantity + excluded.quantity', 'excluded.quantity'),
+    'mysql': (
+        'INSERT INTO {table} (cart_id, product_id, quantity) VALUES {rows} AS new '
+        'ON DUPLICATE KEY UPDATE {table}.quantity = {quantity}',
+        '{table}.quantity + new.quantity', 'new.quantity'),
+}
+
+
+def get_cart_store():
+    """Return the store configured by `STORE_CART_STORE`."""
+    global _store
+    if _store is None:
+        path = getattr(settings, 'STORE_CART_STORE', 'store.carts.DatabaseCartStore')
+        _store = import_string(path)()
+    return _store
+
+
+@receiver(setting_changed)
+def reset_cart_store(setting, **kwargs):
+    global _store
+    if setting.startswith('STORE_CART_'):
+        _store = None
+
+
+def get_cart_total(cart_id):
+    """
+    Return the total price of a cart. It is cached until the cart's items
+    change, see `items_changed`, or a product is updated.
+    """
+    key = make_key('cart-total', [PRODUCTS, cart_namespace(cart_id)], cart_id)
+    return cache.get_or_set(
+        key, lambda: get_cart_store().get_total_price(cart_id), get_timeout())
+
+
+def items_changed(cart_id):
+    bump(cart_namespace(cart_id))
+
+
+def with_items(cart, items):
+    """Make `cart.items.all()` return `items` without a query."""
+    cart._prefetched_objects_cache = {'items': items}
+    return cart
+
+
+def find_abandoned_carts(cutoff, after=None, batch_size=500):
+    """
+    Yield the ids of carts created before `cutoff` in batches, walking the
+    primary key from `after` so each batch is a short range scan.
+    """
+    carts = Cart.objects.filter(created_at__lt=cutoff).order_by('pk')
+    while True:
+        batch = carts if after is None else carts.filter(pk__gt=after)
+        ids = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        after = ids[-1]
+
+
+def purge_carts(ids):
+    """Delete carts and their items, return how many of each were deleted."""
+    with transaction.atomic():
+        _, deleted = Cart.objects.filter(pk__in=ids).delete()
+    return deleted.get(Cart._meta.label, 0), deleted.get(CartItem._meta.label, 0)
+
+
+class DatabaseCartStore:
+    """
+    Keep carts in the `Cart` and `CartItem` tables.
+
+    Methods taking a `queryset` use it, e.g. with sparse fieldsets applied,
+    instead of the default one. Missing carts and items return None.
+    """
+
+    def get_item_queryset(self, cart_id):
+        return CartItem.objects.filter(
+            cart_id=cart_id).select_related('product').with_total_price()
+
+    def create_cart(self):
+        return with_items(Cart.objects.create(), [])
+
+    def get_cart(self, cart_id, queryset=None):
+        if queryset is None:
+            queryset = Cart.objects.prefetch_related(Prefetch(
+                'items', CartItem.objects.select_related('product').with_total_price()))
+        return queryset.filter(pk=cart_id).first()
+
+    def delete_cart(self, cart_id):
+        deleted, _ = Cart.objects.filter(pk=cart_id).delete()
+        items_changed(cart_id)
+        return bool(deleted)
+
+    def get_items(self, cart_id, queryset=None):
+        if queryset is None:
+            queryset = self.get_item_queryset(cart_id)
+        return list(queryset)
+
+    def get_item(self, cart_id, item_id, queryset=None):
+        if queryset is None:
+            queryset = self.get_item_queryset(cart_id)
+        return queryset.filter(pk=item_id).first()
+
+    def get_total_price(self, cart_id):
+        return CartItem.objects.filter(cart_id=cart_id).get_total_price()
+
+    def add_item(self, cart_id, product_id, quantity):
+        """
+        Insert the item, or add to its quantity if the product is already in
+        the cart, with a single upsert so concurrent adds can't collide.
+        """
+        item = self._upsert_item(cart_id, product_id, quantity)
+        if item is not None:
+            items_changed(cart_id)
+        return item
+
+    def _upsert_item(self, cart_id, product_id, quantity):
+        connection = connections[router.db_for_write(CartItem)]
+        sql = UPSERT_SQL.get(connection.vendor)
+        if sql is None or (connection.vendor != 'mysql'
+                           and not connection.features.can_return_columns_from_insert):
+            if not Cart.objects.filter(pk=cart_id).exists():
+                return None
+            return self._add_item_with_savepoint(cart_id, product_id, quantity)
+
+        params = [product_id, quantity, Cart._meta.pk.get_db_prep_value(cart_id, connection)]
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(
+                table=CartItem._meta.db_table, cart_table=Cart._meta.db_table), params)
+            if connection.vendor == 'mysql':
+                if not cursor.rowcount:
+                    return None
+                # LAST_INSERT_ID(id) hands back the id of the updated row too
+                item_id = cursor.lastrowid
+                cursor.execute(
+                    f'SELECT quantity FROM {CartItem._meta.db_table} WHERE id = %s', [item_id])
+                total, = cursor.fetchone()
+            else:
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                item_id, total = row
+        return CartItem(id=item_id, cart_id=cart_id, product_id=product_id, quantity=total)
+
+    def _add_item_with_savepoint(self, cart_id, product_id, quantity):
+        try:
+            with transaction.atomic():
+                return CartItem.objects.create(
+                    cart_id=cart_id, product_id=product_id, quantity=quantity)
+        except IntegrityError:
+            # Lost the race to insert, the row exists now
+            items = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+            items.update(quantity=F('quantity') + quantity)
+            return items.get()
+
+    def add_items(self, cart_id, quantities, replace=False):
+        """
+        Add `{product id: quantity}` to a cart with one multi-row upsert and
+        return the updated cart. With `replace` the cart ends up holding
+        exactly those products and quantities.
+        """
+        connection = connections[router.db_for_write(CartItem)]
+        with transaction.atomic(using=connection.alias):
+            if not Cart.objects.filter(pk=cart_id).exists():
+                return None
+            if replace:
+                CartItem.objects.filter(cart_id=cart_id).exclude(
+                    product_id__in=list(quantities)).delete()
+            if quantities:
+                self._upsert_items(connection, cart_id, quantities, replace)
+            items_changed(cart_id)
+        return self.get_cart(cart_id)
+
+    def _upsert_items(self, connection, cart_id, quantities, replace):
+        if connection.vendor not in BULK_UPSERT_SQL:
+            for product_id, quantity in quantities.items():
+                if replace:
+                    CartItem.objects.update_or_create(
+                        cart_id=cart_id, product_id=product_id,
+                        defaults={'quantity': quantity})
+                else:
+                    self._add_item_with_savepoint(cart_id, product_id, quantity)
+            return
+
+        sql, added, replaced = BULK_UPSERT_SQL[connection.vendor]
+        table = CartItem._meta.db_table
+        cart_id = Cart._meta.pk.get_db_prep_value(cart_id, connection)
+        params = []
+        for product_id, quantity in quantities.items():
+            params += [cart_id, product_id, quantity]
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(
+                table=table,
+                rows=', '.join(['(%s, %s, %s)'] * len(quantities)),
+                quantity=(replaced if replace else added).format(table=table),
+            ), params)
+
+    def update_item(self, cart_id, item_id, quantity):
+        if not CartItem.objects.filter(cart_id=cart_id, pk=item_id).update(quantity=quantity):
+            return None
+        items_changed(cart_id)
+        return CartItem(id=item_id, cart_id=cart_id, quantity=quantity)
+
+    def delete_item(self, cart_id, item_id):
+        deleted, _ = CartItem.objects.filter(cart_id=cart_id, pk=item_id).delete()
+        items_changed(cart_id)
+        return bool(deleted)
+
+    def checkout(self, cart_id):
+        """
+        Return the items of a cart being turned into an order and drop the
+        cart with the surrounding transaction.
+        """
+        items = self.get_items(cart_id)
+        self.delete_cart(cart_id)
+        return items
+
+
+class RedisCartStore:
+    """
+    Keep carts in Redis hashes that expire `STORE_CART_TTL` seconds after
+    their last change, so abandoned carts never reach the database.
+
+    A cart is the hash `store:cart:<id>` holding `created_at`, and per
+    product `q:<product id>` (quantity, updated with HINCRBY) and
+    `i:<product id>` (the item id, drawn from a global counter). Only the
+    order created at checkout is written to the relational tables.
+    """
+    key_prefix = 'store:cart:'
+    item_id_key = 'store:cart-item-id'
+
+    def __init__(self):
+        self.alias = getattr(settings, 'STORE_CART_REDIS', 'redis')
+        self.ttl = getattr(settings, 'STORE_CART_TTL', 7 * 24 * 60 * 60)
+
+    @property
+    def client(self):
+        return get_redis_connection(self.alias)
+
+    def get_key(self, cart_id):
+        return f'{self.key_prefix}{cart_id}'
+
+    def load(self, cart_id):
+        """Return `(created_at, {product id: (item id, quantity)})` or None."""
+        fields = {key.decode(): value.decode()
+                  for key, value in self.client.hgetall(self.get_key(cart_id)).items()}
+        if 'created_at' not in fields:
+            return None
+        items = {}
+        for field, value in fields.items():
+            if field.startswith('i:'):
+                product_id = int(field[2:])
+                quantity = int(fields.get(f'q:{product_id}', 0))
+                if quantity > 0:
+                    items[product_id] = (int(value), quantity)
+        return datetime.fromisoformat(fields['created_at']), items
+
+    def build_items(self, cart_id, items, products=None):
+        """Turn stored items into unsaved `CartItem`s, dropping deleted products."""
+        if products is None:
+            products = Product.objects.only(
+                'id', 'title', 'description', 'unit_price').in_bulk(list(items))
+        items = sorted([
+            CartItem(id=item_id, cart_id=cart_id, product=products[product_id],
+                     quantity=quantity)
+            for product_id, (item_id, quantity) in items.items() if product_id in products
+        ], key=lambda item: item.id)
+        for item in items:
+            item.total_price = item.quantity * item.product.unit_price
+        return items
+
+    def create_cart(self):
+        cart = Cart(created_at=timezone.now())
+        key = self.get_key(cart.id)
+        pipeline = self.client.pipeline()
+        pipeline.hset(key, 'created_at', cart.created_at.isoformat())
+        pipeline.expire(key, self.ttl)
+        pipeline.execute()
+        return with_items(cart, [])
+
+    def get_cart(self, cart_id, queryset=None):
+        stored = self.load(cart_id)
+        if stored is None:
+            return None
+        created_at, items = stored
+        return with_items(
+            Cart(id=cart_id, created_at=created_at), self.build_items(cart_id, items))
+
+    def delete_cart(self, cart_id):
+        items_changed(cart_id)
+        return bool(self.client.delete(self.get_key(cart_id)))
+
+    def get_items(self, cart_id, queryset=None):
+        stored = self.load(cart_id)
+        if stored is None:
+            return []
+        return self.build_items(cart_id, stored[1])
+
+    def get_item(self, cart_id, item_id, queryset=None):
+        return next((item for item in self.get_items(cart_id) if item.id == item_id), None)
+
+    def get_total_price(self, cart_id):
+        return sum((item.total_price for item in self.get_items(cart_id)), Decimal(0))
+
+    def find_product(self, cart_id, item_id):
+        stored = self.load(cart_id)
+        if stored is None:
+            return None
+        return next((product_id for product_id, (pk, _) in stored[1].items()
+                     if pk == item_id), None)
+
+    def add_item(self, cart_id, product_id, quantity):
+        key = self.get_key(cart_id)
+        client = self.client
+        if not client.exists(key):
+            return None
+        new_id = client.incr(self.item_id_key)
+        pipeline = client.pipeline()
+        pipeline.hsetnx(key, f'i:{product_id}', new_id)
+        pipeline.hincrby(key, f'q:{product_id}', quantity)
+        pipeline.hget(key, f'i:{product_id}')
+        pipeline.expire(key, self.ttl)
+        _, total, item_id, _ = pipeline.execute()
+        items_changed(cart_id)
+        return CartItem(id=int(item_id), cart_id=cart_id, product_id=product_id, quantity=total)
+
+    def add_items(self, cart_id, quantities, replace=False):
+        key = self.get_key(cart_id)
+        client = self.client
+        stored = self.load(cart_id)
+        if stored is None:
+            return None
+        # Reserve an id for every product up front, unused ones are skipped
+        first_id = client.incr(self.item_id_key, len(quantities)) - len(quantities) + 1
+        pipeline = client.pipeline()
+        if replace:
+            for product_id in set(stored[1]) - set(quantities):
+                pipeline.hdel(key, f'i:{product_id}', f'q:{product_id}')
+        for offset, (product_id, quantity) in enumerate(quantities.items()):
+            pipeline.hsetnx(key, f'i:{product_id}', first_id + offset)
+            if replace:
+                pipeline.hset(key, f'q:{product_id}', quantity)
+            else:
+                pipeline.hincrby(key, f'q:{product_id}', quantity)
+        pipeline.expire(key, self.ttl)
+        pipeline.execute()
+        items_changed(cart_id)
+        return self.get_cart(cart_id)
+
+    def update_item(self, cart_id, item_id, quantity):
+        product_id = self.find_product(cart_id, item_id)
+        if product_id is None:
+            return None
+        key = self.get_key(cart_id)
+        pipeline = self.client.pipeline()
+        pipeline.hset(key, f'q:{product_id}', quantity)
+        pipeline.expire(key, self.ttl)
+        pipeline.execute()
+        items_changed(cart_id)
+        return CartItem(id=item_id, cart_id=cart_id, product_id=product_id, quantity=quantity)
+
+    def delete_item(self, cart_id, item_id):
+        product_id = self.find_product(cart_id, item_id)
+        if product_id is None:
+            return False
+        self.client.hdel(self.get_key(cart_id), f'i:{product_id}', f'q:{product_id}')
+        items_changed(cart_id)
+        return True
+
+    def checkout(self, cart_id):
+        """
+        Return the items of a cart being turned into an order. The cart is
+        only dropped once the order is committed, so a failed checkout
+        leaves it untouched.
+        """
+        items = self.get_items(cart_id)
+        transaction.on_commit(lambda: self.delete_cart(cart_id))
+        return items
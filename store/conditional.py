@@ -0,0 +1,78 @@
+import hashlib
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .cache import get_versions, get_timeout, make_key, request_fingerprint
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+
+
+class ConditionalResponseMixin:
+    """
+    Send strong ETags on `list` and `retrieve` and answer `If-None-Match`
+    and `If-Modified-Since` with a 304 before anything is serialized.
+
+    Detail validators combine the `last_modified_field` of the product
+    with the versions of `get_cache_namespaces()` (see
+    `VersionedCacheMixin`), which move whenever a related collection or
+    promotion changes. The list only gets an ETag, built from the versions
+    and the query string alone: every write the cached list follows bumps
+    them, so its revalidation never aggregates over the rows. Validators
+    are cached under those versions too, so a revalidation usually doesn't
+    reach the database.
+    """
+    last_modified_field = 'last_update'
+
+    def get_list_validators(self):
+        etag = make_etag(
+            *sorted(get_versions(*self.get_cache_namespaces()).items()),
+            request_fingerprint(self.request))
+        return etag, None
+
+    def get_detail_validators(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        try:
+            last_modified = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).values_list(self.last_modified_field, flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            last_modified = None
+        if last_modified is None:
+            # Let `retrieve` answer with its 404
+            return None, None
+        etag = make_etag(
+            last_modified,
+            *sorted(get_versions(*self.get_cache_namespaces()).items()),
+            request_fingerprint(self.request))
+        return etag, last_modified
+
+    def conditional_response(self, action, validators, request, *args, **kwargs):
+        key = make_key(f'{self.basename}-{self.action}-validators',
+                       self.get_cache_namespaces(),
+                       request_fingerprint(request))
+        etag, last_modified = cache.get_or_set(key, validators, get_timeout())
+        if etag is None:
+            return action(request, *args, **kwargs)
+
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()))
+        if response is None:
+            response = action(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, self.get_list_validators, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, self.get_detail_validators, request, *args, **kwargs)
@@ -0,0 +1,82 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from django.apps import apps
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+_batch = threading.local()
+
+
+def _collection_model():
+    return apps.get_model('store', 'Collection')
+
+
+def _product_model():
+    return apps.get_model('store', 'Product')
+
+
+def _apply(deltas):
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    if not deltas:
+        return
+    # One UPDATE whatever the number of collections, relative to the
+    # stored value so concurrent writers don't lose each other's changes.
+    change = Case(
+        *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+        default=Value(0), output_field=IntegerField())
+    _collection_model().objects.filter(pk__in=deltas).update(
+        products_count=F('products_count') + change)
+
+
+def adjust_products_count(deltas):
+    """Add `{collection id: delta}` to the stored product counts."""
+    pending = getattr(_batch, 'pending', None)
+    if pending is not None:
+        pending.update(deltas)
+        return
+    _apply(deltas)
+
+
+@contextmanager
+def batch_products_count():
+    """
+    Collect the count adjustments made inside the block and apply them
+    with a single UPDATE when it exits without an error.
+    """
+    if getattr(_batch, 'pending', None) is not None:
+        yield
+        return
+
+    _batch.pending = Counter()
+    try:
+        yield
+        deltas = _batch.pending
+    finally:
+        _batch.pending = None
+    _apply(deltas)
+
+
+def count_by_collection(queryset):
+    return Counter(dict(
+        queryset.order_by().values_list('collection_id').annotate(Count('pk'))))
+
+
+def products_count_subquery():
+    products = _product_model().objects.filter(collection=OuterRef('pk')).order_by()
+    return Coalesce(Subquery(
+        products.values('collection').annotate(count=Count('pk')).values('count')), 0)
+
+
+def find_products_count_drift():
+    """Return `(collection, stored, actual)` for every wrong counter."""
+    collections = _collection_model().objects.annotate(
+        actual_count=products_count_subquery()
+    ).exclude(products_count=F('actual_count')).order_by('pk')
+    return [(collection, collection.products_count, collection.actual_count)
+            for collection in collections]
+
+
+def rebuild_products_count():
+    """Recount every collection in one UPDATE, return the rows written."""
+    return _collection_model().objects.update(products_count=products_count_subquery())
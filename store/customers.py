@@ -0,0 +1,23 @@
+from django.core.cache import cache
+from .models import Customer
+
+CUSTOMER_ID_KEY = 'store:customer-id:{}'
+
+
+def get_customer_id(user_id):
+    """
+    Return the id of a user's customer, or None. The mapping is cached
+    until the customer is saved or deleted, see `store.signals`.
+    """
+    key = CUSTOMER_ID_KEY.format(user_id)
+    customer_id = cache.get(key)
+    if customer_id is None:
+        customer_id = Customer.objects.filter(
+            user_id=user_id).values_list('id', flat=True).first()
+        if customer_id is not None:
+            cache.set(key, customer_id, None)
+    return customer_id
+
+
+def forget_customer_id(*user_ids):
+    cache.delete_many([CUSTOMER_ID_KEY.format(user_id) for user_id in user_ids])
@@ -0,0 +1,38 @@
+from django.db.models import Q
+from .models import OrderItem
+
+ORDER_EXPORT_FIELDS = [
+    'order_id', 'placed_at', 'payment_status', 'customer_id',
+    'item_id', 'product_id', 'product_title', 'quantity', 'unit_price',
+]
+
+
+def export_orders(placed_after=None, placed_before=None, payment_status=None, chunk_size=2000):
+    """
+    Yield one dict per order item, with its order's columns, for the orders
+    placed in [`placed_after`, `placed_before`) with the given status.
+
+    Rows are read in (order, item) primary key order, `chunk_size` at a
+    time, each chunk seeking past the last one, so memory stays flat and
+    no chunk costs more than the first whatever the number of orders.
+    """
+    items = OrderItem.objects.order_by('order_id', 'id').values_list(
+        'order_id', 'order__placed_at', 'order__payment_status', 'order__customer_id',
+        'id', 'product_id', 'product__title', 'quantity', 'unit_price')
+    if placed_after is not None:
+        items = items.filter(order__placed_at__gte=placed_after)
+    if placed_before is not None:
+        items = items.filter(order__placed_at__lt=placed_before)
+    if payment_status is not None:
+        items = items.filter(order__payment_status=payment_status)
+
+    position = Q()
+    while True:
+        read = 0
+        for row in items.filter(position)[:chunk_size].iterator(chunk_size=chunk_size):
+            read += 1
+            yield dict(zip(ORDER_EXPORT_FIELDS, row))
+        if read < chunk_size:
+            return
+        order_id, item_id = row[0], row[4]
+        position = Q(order_id__gt=order_id) | Q(order_id=order_id, id__gt=item_id)
@@ -0,0 +1,64 @@
+from decimal import Decimal
+from django.db.models import Q, Case, When, Value, Count, CharField, IntegerField
+
+# Same bands as the admin's inventory filter: (parameter, label, condition)
+INVENTORY_BANDS = [
+    ('<10', 'Low', Q(quantity__lt=10)),
+    ('<50', 'Mid', Q(quantity__gt=10, quantity__lt=50)),
+    ('>50', 'Good', Q(quantity__gt=50)),
+]
+
+# Lower bounds of the unit price buckets, the last one is open ended
+PRICE_BUCKETS = [Decimal(0), Decimal(10), Decimal(50), Decimal(100), Decimal(500)]
+
+
+def get_price_ranges():
+    return list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + [None]))
+
+
+def compute_facets(queryset):
+    """
+    Count products per collection, price bucket and inventory band.
+
+    All three facets come out of a single GROUP BY over the combinations
+    of (collection, bucket, band), which are then folded in Python.
+    """
+    price_bucket = Case(
+        *[When(unit_price__lt=upper, then=Value(index))
+          for index, (_, upper) in enumerate(get_price_ranges()) if upper is not None],
+        default=Value(len(PRICE_BUCKETS) - 1),
+        output_field=IntegerField())
+    inventory_band = Case(
+        *[When(condition, then=Value(label)) for _, label, condition in INVENTORY_BANDS],
+        default=None,
+        output_field=CharField())
+
+    rows = queryset.order_by().values(
+        'collection_id', 'collection__name',
+        price_bucket=price_bucket, inventory_band=inventory_band,
+    ).annotate(count=Count('id'))
+
+    collections = {}
+    prices = [0] * len(PRICE_BUCKETS)
+    bands = {label: 0 for _, label, _ in INVENTORY_BANDS}
+    for row in rows:
+        collection = collections.setdefault(row['collection_id'], {
+            'id': row['collection_id'],
+            'name': row['collection__name'],
+            'count': 0,
+        })
+        collection['count'] += row['count']
+        prices[row['price_bucket']] += row['count']
+        if row['inventory_band'] is not None:
+            bands[row['inventory_band']] += row['count']
+
+    return {
+        'collection': sorted(collections.values(), key=lambda c: c['id']),
+        'price': [
+            {'min': lower, 'max': upper, 'count': count}
+            for (lower, upper), count in zip(get_price_ranges(), prices)
+        ],
+        'inventory': [
+            {'band': label, 'count': count} for label, count in bands.items()
+        ],
+    }
@@ -0,0 +1,95 @@
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsetsMixin:
+    """
+    Support `?fields=a,b` and `?omit=c` on GET requests.
+
+    The selection is pushed down into the query: only the columns listed in
+    `sparse_field_sources` for the chosen fields are loaded, relations are
+    joined only when a source traverses them and `sparse_field_prefetches`
+    are only prefetched when their field is rendered.
+    """
+    fields_param = 'fields'
+    omit_param = 'omit'
+
+    # serializer field -> model columns it reads (`relation__column` joins)
+    sparse_field_sources = {}
+    # serializer field -> lookups to prefetch when it is rendered
+    sparse_field_prefetches = {}
+
+    def get_sparse_fields(self):
+        """Return the serializer fields to render or None to render them all."""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self._parse_sparse_fields()
+        return self._sparse_fields
+
+    def _parse_sparse_fields(self):
+        if self.request is None or self.request.method != 'GET':
+            return None
+        params = self.request.query_params
+        if self.fields_param not in params and self.omit_param not in params:
+            return None
+
+        available = list(self.sparse_field_sources)
+        requested = self._split(params.get(self.fields_param)) or available
+        omitted = self._split(params.get(self.omit_param))
+        unknown = [name for name in requested + omitted if name not in available]
+        if unknown:
+            raise ValidationError(
+                {self.fields_param: f'Unknown fields: {", ".join(unknown)}.'})
+        return [name for name in available
+                if name in requested and name not in omitted]
+
+    @staticmethod
+    def _split(value):
+        return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+    def get_queryset(self):
+        return self.apply_sparse_fields(super().get_queryset())
+
+    def apply_sparse_fields(self, queryset):
+        """
+        Load only what the selected fields read. Views overriding
+        `get_queryset` call this on the queryset they build.
+        """
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+
+        # The primary key and sortable columns are needed for pagination
+        concrete = {field.name for field in queryset.model._meta.concrete_fields}
+        columns = {queryset.model._meta.pk.name}
+        columns.update(concrete.intersection(getattr(self, 'ordering_fields', None) or []))
+        related, prefetches = set(), []
+        for name in fields:
+            for source in self.sparse_field_sources[name]:
+                columns.add(source)
+                if '__' in source:
+                    relation = source.rsplit('__', 1)[0]
+                    related.add(relation)
+                    columns.add(relation)
+            prefetches += self.sparse_field_prefetches.get(name, [])
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*dict.fromkeys(prefetches))
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return serializer
+
+        # Serializers without declared fields pick the selection up from
+        # their context, see `ProductValuesSerializer`.
+        serializer.context['fields'] = fields
+        target = getattr(serializer, 'child', serializer)
+        if hasattr(target, 'fields'):
+            for name in list(target.fields):
+                if name not in fields:
+                    target.fields.pop(name)
+        return serializer
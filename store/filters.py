@@ -1,5 +1,7 @@
 from django_filters.rest_framework import FilterSet
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
 from .models import Product
+from .search import search_products
 
 
 class ProductFilter(FilterSet):
@@ -7,5 +9,24 @@ class ProductFilter(FilterSet):
         model = Product
         fields = {
             'collection_id': ['exact'],
-            'unit_price': ['gt', 'lt']
+            'unit_price': ['gt', 'lt'],
+            'effective_price': ['gt', 'lt'],
         }
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Full-text `?search=` over product title and description.
+
+    Results are ordered by relevance unless `?ordering=` is given.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        queryset = search_products(queryset, query)
+        if OrderingFilter.ordering_param not in request.query_params:
+            queryset = queryset.order_by('-search_rank', 'id')
+        return queryset
@@ -0,0 +1,60 @@
+"""
+Idempotency keys: a request sent with an `Idempotency-Key` header runs
+once per user and key, and retries get the stored response back without
+running it again.
+
+The key row is created, or locked if it exists, in the transaction that
+runs the request and stores its response. A concurrent duplicate waits on
+that row or on the unique index until the first request commits and then
+replays its response; if the first request fails, nothing is stored and
+the key may be retried.
+"""
+import hashlib
+import json
+from django.db import transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+class KeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def get_request_hash(data):
+    body = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def respond_once(user_id, key, data, respond):
+    """
+    Return `respond()` the first time the user sends `key`, and the stored
+    response to every retry. Raises `KeyReused` if the retry's `data`
+    differs from the first request's.
+    """
+    if not 0 < len(key) <= IdempotencyKey._meta.get_field('key').max_length:
+        raise ValidationError({HEADER: ['Must be between 1 and 255 characters.']})
+    request_hash = get_request_hash(data)
+    with transaction.atomic():
+        record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+            user_id=user_id, key=key, defaults={'request_hash': request_hash})
+        if record.request_hash != request_hash:
+            raise KeyReused()
+        if not created:
+            response = Response(record.response_body, status=record.response_status)
+            response[REPLAYED_HEADER] = 'true'
+            return response
+
+        response = respond()
+        record.response_status = response.status_code
+        # Stored as rendered, so replays match the original byte for byte
+        record.response_body = json.loads(JSONRenderer().render(response.data))
+        record.save(update_fields=['response_status', 'response_body'])
+        return response
@@ -0,0 +1,48 @@
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from .cache import PRODUCTS, bump, product_namespace
+from .models import Product
+
+
+class InsufficientStock(Exception):
+    """Raised with `{product id: (requested, available)}` for every short product."""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(', '.join(
+            f'product {pk}: {requested} requested, {available} available'
+            for pk, (requested, available) in shortages.items()))
+
+
+def reserve_stock(quantities):
+    """
+    Take `{product id: quantity}` out of stock with one conditional UPDATE,
+    inside the caller's transaction. Either every product has enough stock
+    or nothing is taken and `InsufficientStock` is raised.
+    """
+    ids = sorted(quantities)
+    if not ids:
+        return
+    with transaction.atomic():
+        # Lock in primary key order, so checkouts sharing products queue
+        # behind each other instead of deadlocking.
+        list(Product.objects.select_for_update().filter(
+            pk__in=ids).order_by('pk').values_list('pk', flat=True))
+
+        requested = Case(
+            *[When(pk=pk, then=Value(quantities[pk])) for pk in ids],
+            output_field=IntegerField())
+        # Plain `QuerySet.update`: a checkout only changes the stock of its
+        # own products, so it drops the product lists, which show the stock,
+        # and the details of those products, but not every cached detail
+        # and the collections like `ProductQuerySet.update` would.
+        rows = models.QuerySet.update(
+            Product.objects.filter(pk__in=ids, quantity__gte=requested),
+            quantity=F('quantity') - requested, last_update=timezone.now())
+        if rows < len(ids):
+            stock = dict(Product.objects.filter(pk__in=ids).values_list('pk', 'quantity'))
+            raise InsufficientStock({
+                pk: (quantities[pk], stock.get(pk, 0)) for pk in ids
+                if stock.get(pk, 0) < quantities[pk]})
+    bump(PRODUCTS, *map(product_namespace, ids))
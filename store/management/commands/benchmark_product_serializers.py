@@ -0,0 +1,50 @@
+from timeit import default_timer
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from store.models import Product
+from store.serializers import ProductReadSerializer, ProductValuesSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare ProductReadSerializer with the values() based fast path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000,
+                            help='Number of products rendered per run.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of runs, the best one is reported.')
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.select_related(
+            'collection').prefetch_related('promotion').order_by('id')[:options['limit']]
+        if not queryset.exists():
+            raise CommandError('There are no products to benchmark.')
+
+        renderer = JSONRenderer()
+
+        def render_instances():
+            return renderer.render(ProductReadSerializer(queryset.all(), many=True).data)
+
+        def render_values():
+            rows = ProductValuesSerializer.get_queryset(queryset.all())
+            return renderer.render(ProductValuesSerializer(rows, many=True).data)
+
+        if render_instances() != render_values():
+            raise CommandError('The two serializers rendered different JSON.')
+
+        model_time = self.best_of(render_instances, options['repeat'])
+        values_time = self.best_of(render_values, options['repeat'])
+
+        count = queryset.count()
+        self.stdout.write(f'ProductReadSerializer:   {model_time * 1000:8.1f} ms for {count} products')
+        self.stdout.write(f'ProductValuesSerializer: {values_time * 1000:8.1f} ms for {count} products')
+        self.stdout.write(self.style.SUCCESS(
+            f'Speedup: {model_time / values_time:.1f}x, output is identical'))
+
+    def best_of(self, render, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = default_timer()
+            render()
+            timings.append(default_timer() - start)
+        return min(timings)
@@ -0,0 +1,44 @@
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from store.outbox import claim_events, dispatch_events
+
+
+class Command(BaseCommand):
+    help = 'Dispatch outbox events to their handlers, retrying failures with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Threads running handlers in parallel.')
+        parser.add_argument('--lease', type=int, default=60,
+                            help='Seconds a claimed event is hidden from other workers.')
+        parser.add_argument('--max-attempts', type=int, default=10)
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Seconds to wait when no event is due.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no event is due instead of polling.')
+
+    def handle(self, *args, **options):
+        dispatched = failed = 0
+        workers = options['workers']
+        # A single worker runs handlers in this thread
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else nullcontext()
+        with pool as executor:
+            while True:
+                events = claim_events(
+                    options['batch_size'], options['lease'], options['max_attempts'])
+                if events:
+                    done, errors = dispatch_events(events, executor)
+                    dispatched += done
+                    failed += errors
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'{done} events dispatched, {errors} failed.')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{dispatched} events dispatched, {failed} failed.'))
@@ -0,0 +1,37 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from store.exports import ORDER_EXPORT_FIELDS, export_orders
+from store.serializers import OrderExportSerializer
+from store import streaming
+
+
+class Command(BaseCommand):
+    help = 'Stream order items with their orders to a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='file_format', choices=streaming.FORMATS,
+                            default=streaming.CSV)
+        parser.add_argument('--output', help='Defaults to standard output.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--placed-after', help='Date or datetime, inclusive.')
+        parser.add_argument('--placed-before', help='Date or datetime, exclusive.')
+        parser.add_argument('--payment-status', help='P, C or F.')
+
+    def handle(self, *args, **options):
+        params = OrderExportSerializer(data={
+            name: options[name] for name in
+            ['file_format', 'placed_after', 'placed_before', 'payment_status', 'chunk_size']
+            if options[name] is not None})
+        if not params.is_valid():
+            raise CommandError(params.errors)
+        filters = dict(params.validated_data)
+        file_format = filters.pop('file_format')
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            rows = export_orders(**filters)
+            for line in streaming.encode(ORDER_EXPORT_FIELDS, rows, file_format):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
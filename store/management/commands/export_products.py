@@ -0,0 +1,24 @@
+import sys
+from django.core.management.base import BaseCommand
+from store.bulk import EXPORT_FIELDS, export_products
+from store import streaming
+
+
+class Command(BaseCommand):
+    help = 'Stream every product to a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='file_format', choices=streaming.FORMATS,
+                            default=streaming.CSV)
+        parser.add_argument('--output', help='Defaults to standard output.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            rows = export_products(chunk_size=options['chunk_size'])
+            for line in streaming.encode(EXPORT_FIELDS, rows, options['file_format']):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
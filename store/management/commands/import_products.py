@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from store.bulk import ProductImporter
+from store import streaming
+
+
+class Command(BaseCommand):
+    help = 'Create or update products from a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=streaming.FORMATS,
+                            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or options['path'].rsplit('.', 1)[-1]
+        if file_format not in streaming.FORMATS:
+            raise CommandError(f'Cannot tell the format of {options["path"]}, use --format.')
+
+        with open(options['path'], newline='', encoding='utf-8') as stream:
+            rows = streaming.decode(stream, file_format, list_fields=['promotion'])
+            report = ProductImporter(batch_size=options['batch_size']).run(rows)
+
+        for error in report['errors']:
+            self.stderr.write(f'Row {error["row"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{report["created"]} products created, {report["updated"]} updated, '
+            f'{len(report["errors"])} rows rejected.'))
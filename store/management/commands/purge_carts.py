@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from store.carts import find_abandoned_carts, purge_carts
+from store.models import CartItem
+
+CHECKPOINT_KEY = 'store:purge-carts:checkpoint'
+
+
+class Command(BaseCommand):
+    help = ('Delete carts older than --days in small batches. An interrupted run '
+            'resumes after the last deleted batch.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Age in days after which a cart is abandoned.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between batches.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count what would be deleted without deleting it.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint of an interrupted run.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        after = None if options['restart'] else cache.get(CHECKPOINT_KEY)
+        if after is not None:
+            self.stdout.write(f'Resuming after cart {after}.')
+
+        carts = items = 0
+        started = time.monotonic()
+        batches = find_abandoned_carts(cutoff, after, options['batch_size'])
+        for number, ids in enumerate(batches, 1):
+            if dry_run:
+                batch_carts = len(ids)
+                batch_items = CartItem.objects.filter(cart_id__in=ids).count()
+            else:
+                batch_carts, batch_items = purge_carts(ids)
+                # Deleted rows are gone either way, this only skips the scan
+                cache.set(CHECKPOINT_KEY, ids[-1], None)
+            carts += batch_carts
+            items += batch_items
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Batch {number}: {batch_carts} carts, {batch_items} items.')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        if not dry_run:
+            cache.delete(CHECKPOINT_KEY)
+        elapsed = time.monotonic() - started
+        rate = carts / elapsed if elapsed else 0
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {carts} carts and {items} items created before {cutoff:%Y-%m-%d %H:%M} '
+            f'in {elapsed:.1f}s ({rate:.0f} carts/s).'))
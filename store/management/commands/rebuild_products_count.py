@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from store import cache
+from store.counters import find_products_count_drift, rebuild_products_count
+
+
+class Command(BaseCommand):
+    help = 'Recount the products of every collection, or only check the stored counts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Report wrong counts without fixing them.')
+
+    def handle(self, *args, **options):
+        drift = find_products_count_drift()
+        for collection, stored, actual in drift:
+            self.stdout.write(
+                f'Collection {collection.pk} ({collection}): stored {stored}, actual {actual}')
+
+        if options['verify']:
+            if drift:
+                raise CommandError(f'{len(drift)} collection counts are wrong.')
+            self.stdout.write(self.style.SUCCESS('All collection counts are correct.'))
+            return
+
+        rebuild_products_count()
+        if drift:
+            cache.bump(cache.COLLECTIONS)
+        self.stdout.write(self.style.SUCCESS(f'Fixed {len(drift)} collection counts.'))
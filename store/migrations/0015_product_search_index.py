@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install_index(apps, schema_editor):
+    from store.search import install_index
+    install_index(schema_editor.connection)
+
+
+def uninstall_index(apps, schema_editor):
+    from store.search import uninstall_index
+    uninstall_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_index, uninstall_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:29
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+from django.db.models import Max
+
+# Frozen copy of `store.pricing` as of this migration
+TAX_RATE = Decimal(1.5)
+CENT = Decimal('0.01')
+BATCH_SIZE = 500
+
+
+def get_effective_price(unit_price, discount=None):
+    discount = min(max(Decimal(str(discount or 0)), Decimal(0)), Decimal(1))
+    return (unit_price * (1 - discount) * TAX_RATE).quantize(CENT, ROUND_HALF_UP)
+
+
+def price_products(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    rows = Product.objects.order_by().values_list('pk', 'unit_price').annotate(
+        discount=Max('promotion__discount')).iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for pk, unit_price, discount in rows:
+        batch.append(Product(pk=pk, effective_price=get_effective_price(unit_price, discount)))
+        if len(batch) >= BATCH_SIZE:
+            Product.objects.bulk_update(batch, ['effective_price'])
+            batch = []
+    Product.objects.bulk_update(batch, ['effective_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_collection_products_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8),
+        ),
+        migrations.RunPython(price_products, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='store_produ_effecti_707a96_idx'),
+        ),
+    ]
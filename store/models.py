@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
+from django.utils import timezone
 from .validators import validate_file_size
+from . import cache, counters, pricing
 from uuid import uuid4
 from decimal import Decimal
 
@@ -15,10 +17,59 @@ class Collection(models.Model):
     name = models.CharField(max_length=255)
     featured_product = models.ForeignKey(
         'Product', on_delete=models.SET_NULL, null=True, related_name='+')
+    # Maintained by the product signals and bulk paths, see `store.counters`
+    products_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Never write back a count loaded before concurrent product changes
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'products_count']
+        super().save(*args, **kwargs)
+
+
+class ProductQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Bulk updates bypass post_save and auto_now, so stamp the rows
+        # and drop every cached product page.
+        kwargs.setdefault('last_update', timezone.now())
+        if kwargs.keys() & {'collection', 'collection_id', 'unit_price'}:
+            rows = self._update_tracked(**kwargs)
+        else:
+            rows = super().update(**kwargs)
+        if rows:
+            cache.bump(cache.PRODUCTS, cache.COLLECTIONS, cache.CATALOG)
+        return rows
+
+    def _update_tracked(self, **kwargs):
+        # Collection counts and effective prices derive from the updated
+        # columns, so pin the rows down before the filter may stop matching
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            updated = self.model.objects.filter(pk__in=pks)
+            moved = 'collection' in kwargs or 'collection_id' in kwargs
+            if moved:
+                before = counters.count_by_collection(updated)
+            rows = super().update(**kwargs)
+            if moved:
+                after = counters.count_by_collection(updated)
+                counters.adjust_products_count({
+                    pk: after[pk] - before[pk] for pk in before.keys() | after.keys()})
+            if 'unit_price' in kwargs:
+                pricing.refresh_effective_prices(updated)
+        return rows
+
+    def touch(self):
+        """
+        Move `last_update` forward when something rendered with the products
+        changed elsewhere. Callers bump the cache namespaces themselves.
+        """
+        return super().update(last_update=timezone.now())
+
 
 class Product(models.Model):
     title = models.CharField(max_length=255)
@@ -31,10 +82,35 @@ class Product(models.Model):
     collection = models.ForeignKey(Collection, on_delete=models.PROTECT)
     last_update = models.DateTimeField(auto_now=True)
     promotion = models.ManyToManyField(Promotion, blank=True)
+    # Unit price less the best promotion discount plus tax, see `store.pricing`
+    effective_price = models.DecimalField(
+        max_digits=8, decimal_places=2, default=0, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.title
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'unit_price' in update_fields:
+            self.effective_price = pricing.get_effective_price(
+                Decimal(self.unit_price), pricing.get_best_discount(self))
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'effective_price'}
+        super().save(*args, **kwargs)
+
+    class Meta:
+        # (field, id) pairs back the keyset pagination seeks
+        indexes = [
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['unit_price', 'id']),
+            models.Index(fields=['quantity', 'id']),
+            models.Index(fields=['effective_price', 'id']),
+            # `ProductFilter`: collection_id + unit_price range
+            models.Index(fields=['collection', 'unit_price']),
+        ]
+
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
@@ -83,6 +159,21 @@ class Order(models.Model):
     placed_at = models.DateTimeField(auto_now_add=True)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # The row stays locked from reading the previous payment status to
+        # moving the sales rollups, see `store.signals`
+        with transaction.atomic(using=kwargs.get('using') or self._state.db):
+            super().save(*args, **kwargs)
+
+    class Meta:
+        # A customer's order history, newest first
+        indexes = [
+            models.Index(fields=['customer', 'placed_at']),
+        ]
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(
@@ -97,6 +188,26 @@ class Cart(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Cleanup of abandoned carts by age
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+
+class CartItemQuerySet(models.QuerySet):
+    def line_total(self):
+        return models.ExpressionWrapper(
+            models.F('quantity') * models.F('product__unit_price'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2))
+
+    def with_total_price(self):
+        return self.annotate(total_price=self.line_total())
+
+    def get_total_price(self):
+        total = self.aggregate(total=models.Sum(self.line_total()))['total']
+        return Decimal(0) if total is None else total
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(
@@ -104,6 +215,8 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = [['product', 'cart']]
 
@@ -116,3 +229,89 @@ class Review(models.Model):
         Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    class Meta:
+        # A product's reviews by date
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """
+    An event written in the transaction that caused it and dispatched
+    afterwards by `manage.py dispatch_outbox`, see `store.outbox`.
+    """
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the event may be claimed next, moved forward by leases and retries
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Claiming the pending events that are due
+        indexes = [
+            models.Index(fields=['dispatched_at', 'available_at']),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.topic} #{self.pk}'
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client's `Idempotency-Key` and the response its first request got,
+    replayed to retries, see `store.idempotency`.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    # sha256 of the request body, a reused key must come with the same one
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [['user', 'key']]
+
+    def __str__(self) -> str:
+        return self.key
+
+
+class ProductSalesDay(models.Model):
+    """Units and revenue of a product's order items, per day and payment status."""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    payment_status = models.CharField(max_length=1, choices=Order.PAYMENT_STATUS_CHOICES)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [['day', 'product', 'payment_status']]
+
+
+class CollectionSalesDay(models.Model):
+    """Units and revenue of a collection's order items, per day and payment status."""
+    day = models.DateField()
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='+')
+    payment_status = models.CharField(max_length=1, choices=Order.PAYMENT_STATUS_CHOICES)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [['day', 'collection', 'payment_status']]
+
+
+class CustomerSales(models.Model):
+    """Orders and revenue of a customer, per payment status."""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='+')
+    payment_status = models.CharField(max_length=1, choices=Order.PAYMENT_STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [['customer', 'payment_status']]
@@ -0,0 +1,133 @@
+"""
+Transactional outbox: events are rows written in the transaction that
+caused them, so they exist exactly when it commits, and are handed to
+their handler afterwards by `manage.py dispatch_outbox`.
+
+Delivery is at least once: a handler that raises, or a worker that dies
+mid-batch, means the event is dispatched again later. Handlers registered
+with `atomic=True` only write to the database; they run in a transaction
+that also marks their event dispatched, so their writes apply exactly once.
+"""
+import traceback
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Order, OutboxEvent
+from . import rollups
+from .signals import order_created
+
+_handlers = {}
+
+
+def handler(topic, atomic=False):
+    """Register the function that dispatches the events of `topic`."""
+    def register(function):
+        _handlers[topic] = (function, atomic)
+        return function
+    return register
+
+
+def publish(topic, **payload):
+    """Record an event, meant to be called inside the caller's transaction."""
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def get_backoff(attempts):
+    """Seconds to wait before retrying an event that failed `attempts` times."""
+    return min(2 ** attempts, 60 * 60)
+
+
+def claim_events(batch_size=100, lease=60, max_attempts=10):
+    """
+    Take up to `batch_size` due events for `lease` seconds and return them.
+
+    The claim commits right away: rows are only locked while their lease
+    is written, and an event whose worker died becomes due again once
+    its lease runs out. Concurrent workers skip each other's locked rows
+    where the database supports it.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = OutboxEvent.objects.filter(
+            dispatched_at__isnull=True, available_at__lte=now, attempts__lt=max_attempts
+        ).order_by('available_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            events = events.select_for_update(skip_locked=True)
+        events = list(events[:batch_size])
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            available_at=now + timedelta(seconds=lease), attempts=F('attempts') + 1)
+    for event in events:
+        event.attempts += 1
+    return events
+
+
+def dispatch(event):
+    """Run the handler of an event, return the error or None."""
+    try:
+        if event.topic not in _handlers:
+            raise LookupError(f'No handler for {event.topic!r} events.')
+        function, atomic = _handlers[event.topic]
+        if not atomic:
+            function(**event.payload)
+            return None
+        with transaction.atomic():
+            # Another worker may have run it once this one's lease ran out
+            pending = OutboxEvent.objects.select_for_update().filter(
+                pk=event.pk, dispatched_at__isnull=True)
+            if pending.values_list('pk', flat=True):
+                function(**event.payload)
+                pending.update(dispatched_at=timezone.now())
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+def _dispatch_in_thread(event):
+    try:
+        return dispatch(event)
+    finally:
+        # Pool threads open their own connection
+        connection.close()
+
+
+def dispatch_events(events, executor=None):
+    """
+    Dispatch claimed events, in parallel when given an executor, and record
+    the outcome. Return how many were dispatched and how many failed.
+    """
+    if executor is None:
+        errors = [dispatch(event) for event in events]
+    else:
+        errors = list(executor.map(_dispatch_in_thread, events))
+
+    now = timezone.now()
+    failed = []
+    for event, error in zip(events, errors):
+        if error is not None:
+            event.last_error = error
+            event.available_at = now + timedelta(seconds=get_backoff(event.attempts))
+            failed.append(event)
+    OutboxEvent.objects.filter(
+        pk__in=[event.pk for event, error in zip(events, errors) if error is None]
+    ).update(dispatched_at=now, last_error='')
+    OutboxEvent.objects.bulk_update(failed, ['last_error', 'available_at'])
+    return len(events) - len(failed), len(failed)
+
+
+@handler('order_created')
+def send_order_created(order_id):
+    # Sent by the checkout serializer as it was before the outbox, so
+    # receivers connected with `sender=` keep firing
+    from .serializers import OrderCreationSerializer
+
+    # Every receiver runs even when one fails, then the event is retried
+    order = Order.objects.get(pk=order_id)
+    for receiver, response in order_created.send_robust(OrderCreationSerializer, order=order):
+        if isinstance(response, Exception):
+            raise response
+
+
+@handler('sales_rollup', atomic=True)
+def record_sales(order_ids, payment_status):
+    rollups.record_orders(order_ids, payment_status)
@@ -1,5 +1,141 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 10
+
+
+class ReportPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination keyed on (ordering field, id).
+
+    Unlike DRF's `CursorPagination` the `id` tiebreaker makes the position
+    unique, so pages are fetched with a plain `WHERE (field, id) > (...)`
+    seek and never fall back to an OFFSET. No COUNT(*) is issued.
+    """
+    page_size = 10
+    ordering = 'id'
+    tiebreaker = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_keyset_ordering(
+            self.get_ordering(request, queryset, view))
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._flip(term) for term in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_seek_filter(ordering, position))
+            except (ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+
+        return self.page
+
+    def get_keyset_ordering(self, ordering):
+        # Only the leading term takes part in the seek, the tiebreaker
+        # follows its direction so the composite index can be walked.
+        term = ordering[0]
+        field_name = term.lstrip('-')
+        if field_name in (self.tiebreaker, 'pk'):
+            return (term.replace('pk', self.tiebreaker),)
+        direction = '-' if term.startswith('-') else ''
+        return (term, direction + self.tiebreaker)
+
+    def get_seek_filter(self, ordering, position):
+        conditions = Q()
+        equal = {}
+        for term, value in zip(ordering, position):
+            field_name = term.lstrip('-')
+            lookup = 'lt' if term.startswith('-') else 'gt'
+            conditions |= Q(**equal, **{f'{field_name}__{lookup}': value})
+            equal[field_name] = value
+        return conditions
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self._get_position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self._get_position(self.page[0]), True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = payload['p'], bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        payload = {'p': position}
+        if reverse:
+            payload['r'] = 1
+        encoded = urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position(self, instance):
+        position = []
+        for term in self.ordering:
+            field_name = term.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[field_name]
+            else:
+                value = getattr(instance, field_name)
+            position.append(value if isinstance(value, int) else str(value))
+        return position
+
+    @staticmethod
+    def _flip(term):
+        return term[1:] if term.startswith('-') else '-' + term
+
+
+class OrderPagination(KeysetPagination):
+    """Newest orders first, seeking on the (customer, placed_at) index."""
+    ordering = '-placed_at'
@@ -0,0 +1,40 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import Max
+
+TAX_RATE = Decimal(1.5)
+CENT = Decimal('0.01')
+
+
+def get_effective_price(unit_price, discount=None):
+    """
+    Return what a customer pays: the unit price less the best promotion
+    discount, a fraction between 0 and 1, plus tax, rounded to the cent.
+    """
+    discount = min(max(Decimal(str(discount or 0)), Decimal(0)), Decimal(1))
+    return (unit_price * (1 - discount) * TAX_RATE).quantize(CENT, ROUND_HALF_UP)
+
+
+def get_best_discount(product):
+    if product.pk is None:
+        return None
+    return product.promotion.aggregate(best=Max('discount'))['best']
+
+
+def refresh_effective_prices(products, batch_size=500):
+    """
+    Recompute the stored effective price of a product queryset and write
+    the ones that changed, returning how many did.
+    """
+    model = products.model
+    # Filtering through a subquery keeps a filter on `promotion` from
+    # narrowing the discounts the maximum is taken over.
+    rows = model.objects.filter(pk__in=products.values('pk')).order_by().values_list(
+        'pk', 'unit_price', 'effective_price').annotate(discount=Max('promotion__discount'))
+
+    changed = []
+    for pk, unit_price, current, discount in rows:
+        price = get_effective_price(unit_price, discount)
+        if price != current:
+            changed.append(model(pk=pk, effective_price=price))
+    model.objects.bulk_update(changed, ['effective_price'], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,200 @@
+"""
+Sales rollups: daily units and revenue per product and per collection,
+and orders and revenue per customer, each split by payment status.
+
+Checkout publishes a `sales_rollup` outbox event, whose handler adds the
+order with `record_orders` outside the checkout transaction, and a
+payment status change moves an order between statuses with
+`move_orders`. Both are relative upserts, so concurrent writers add up
+and a move that lands before the order is recorded still nets out.
+`rebuild_days` and `rebuild_customers` recompute ranges from the orders,
+which is how history is backfilled. They replace rows the relative writes
+also change, so they must not run alongside them: a move that lands
+between the rebuild's read and its delete is lost, and an order recorded
+after the rebuild counted it is counted twice. Orders are dated in the
+current time zone.
+"""
+from datetime import datetime, time, timedelta
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import CollectionSalesDay, CustomerSales, Order, OrderItem, ProductSalesDay
+
+# model -> (key fields, fields added up)
+ROLLUPS = {
+    ProductSalesDay: (['day', 'product_id', 'payment_status'], ['units', 'revenue']),
+    CollectionSalesDay: (['day', 'collection_id', 'payment_status'], ['units', 'revenue']),
+    CustomerSales: (['customer_id', 'payment_status'], ['orders', 'revenue']),
+}
+
+# `(statement, change of each added up column)`
+ON_CONFLICT_SQL = (
+    'INSERT INTO {table} ({columns}) VALUES {rows} '
+    'ON CONFLICT ({keys}) DO UPDATE SET {changes}',
+    '{column} = {table}.{column} + excluded.{column}')
+UPSERT_SQL = {
+    'sqlite': ON_CONFLICT_SQL,
+    'postgresql': ON_CONFLICT_SQL,
+    'mysql': (
+        'INSERT INTO {table} ({columns}) VALUES {rows} ON DUPLICATE KEY UPDATE {changes}',
+        '{column} = {column} + VALUES({column})'),
+}
+
+
+def line_total(prefix=''):
+    return ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}unit_price'),
+        output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def get_rows(items, orders):
+    """
+    Aggregate order items and orders into rollup rows, returned as
+    `{model: [{field: value}]}`.
+    """
+    items = items.order_by().annotate(day=TruncDate('order__placed_at'))
+    totals = {'units': Sum('quantity'), 'revenue': Sum(line_total())}
+    return {
+        ProductSalesDay: [
+            {'day': row['day'], 'product_id': row['product_id'],
+             'payment_status': row['order__payment_status'],
+             'units': row['units'], 'revenue': row['revenue']}
+            for row in items.values('day', 'product_id', 'order__payment_status').annotate(**totals)
+        ],
+        CollectionSalesDay: [
+            {'day': row['day'], 'collection_id': row['product__collection_id'],
+             'payment_status': row['order__payment_status'],
+             'units': row['units'], 'revenue': row['revenue']}
+            for row in items.values(
+                'day', 'product__collection_id', 'order__payment_status').annotate(**totals)
+        ],
+        CustomerSales: [
+            {'customer_id': row['customer_id'], 'payment_status': row['payment_status'],
+             'orders': row['orders'], 'revenue': row['revenue'] or 0}
+            for row in orders.order_by().values('customer_id', 'payment_status').annotate(
+                orders=Count('pk', distinct=True), revenue=Sum(line_total('items__')))
+        ],
+    }
+
+
+def get_order_rows(order_ids):
+    return get_rows(
+        OrderItem.objects.filter(order_id__in=order_ids), Order.objects.filter(pk__in=order_ids))
+
+
+def add(model, rows):
+    """Add the counted fields of `rows` to the stored ones, creating missing rows."""
+    keys, counted = ROLLUPS[model]
+    rows = [row for row in rows if any(row[field] for field in counted)]
+    if not rows:
+        return
+    connection = connections[router.db_for_write(model)]
+    if connection.vendor not in UPSERT_SQL:
+        for row in rows:
+            key = {field: row[field] for field in keys}
+            changes = {field: F(field) + row[field] for field in counted}
+            if not model.objects.filter(**key).update(**changes):
+                model.objects.create(**row)
+        return
+
+    sql, change = UPSERT_SQL[connection.vendor]
+    names = keys + counted
+    fields = [model._meta.get_field(name) for name in names]
+    table = connection.ops.quote_name(model._meta.db_table)
+    params = []
+    for row in rows:
+        params += [field.get_db_prep_save(row[name], connection)
+                   for name, field in zip(names, fields)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(
+            table=table,
+            columns=', '.join(connection.ops.quote_name(field.column) for field in fields),
+            rows=', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(rows)),
+            keys=', '.join(connection.ops.quote_name(field.column) for field in fields[:len(keys)]),
+            changes=', '.join(
+                change.format(table=table, column=connection.ops.quote_name(field.column))
+                for field in fields[len(keys):]),
+        ), params)
+
+
+def _taken_from(model, rows, payment_status):
+    # The same rows subtracted from the status the orders left
+    return [{**row, 'payment_status': payment_status,
+             **{field: -row[field] for field in ROLLUPS[model][1]}}
+            for row in rows]
+
+
+def _merged(model, rows):
+    # Rows sharing a key, summed so one upsert doesn't hit a row twice
+    keys, counted = ROLLUPS[model]
+    merged = {}
+    for row in rows:
+        key = tuple(row[field] for field in keys)
+        if key in merged:
+            for field in counted:
+                merged[key][field] += row[field]
+        else:
+            merged[key] = dict(row)
+    return list(merged.values())
+
+
+def record_orders(order_ids, payment_status=None):
+    """
+    Add new orders to the rollups, under `payment_status` when given, i.e.
+    the status they were placed with, instead of their current one.
+    """
+    for model, rows in get_order_rows(order_ids).items():
+        if payment_status is not None:
+            rows = _merged(model, [{**row, 'payment_status': payment_status} for row in rows])
+        add(model, rows)
+
+
+def move_orders(order_ids, previous_status):
+    """Move orders from `previous_status` to the status they are saved with."""
+    with transaction.atomic():
+        for model, rows in get_order_rows(order_ids).items():
+            add(model, rows + _taken_from(model, rows, previous_status))
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_days(start, end):
+    """
+    Recompute the product and collection rollups of the days in [start, end).
+    Not safe alongside `record_orders` and `move_orders`, see above.
+    """
+    items = OrderItem.objects.filter(
+        order__placed_at__gte=_start_of(start), order__placed_at__lt=_start_of(end))
+    rows = get_rows(items, Order.objects.none())
+    with transaction.atomic():
+        for model in (ProductSalesDay, CollectionSalesDay):
+            model.objects.filter(day__gte=start, day__lt=end).delete()
+            model.objects.bulk_create([model(**row) for row in rows[model]])
+    return len(rows[ProductSalesDay])
+
+
+def rebuild_customers(customer_ids):
+    """
+    Recompute the customer rollups of the given customers. Not safe
+    alongside `record_orders` and `move_orders`, see above.
+    """
+    rows = get_rows(OrderItem.objects.none(), Order.objects.filter(customer_id__in=customer_ids))
+    with transaction.atomic():
+        CustomerSales.objects.filter(customer_id__in=customer_ids).delete()
+        CustomerSales.objects.bulk_create([CustomerSales(**row) for row in rows[CustomerSales]])
+    return len(rows[CustomerSales])
+
+
+def get_days(batch_days=7):
+    """Yield `(start, end)` day ranges covering every order, oldest first."""
+    placed = Order.objects.order_by('placed_at').values_list('placed_at', flat=True)
+    first, last = placed.first(), placed.last()
+    if first is None:
+        return
+    start, end = timezone.localdate(first), timezone.localdate(last) + timedelta(days=1)
+    while start < end:
+        yield start, min(start + timedelta(days=batch_days), end)
+        start += timedelta(days=batch_days)
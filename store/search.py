@@ -0,0 +1,111 @@
+import re
+from django.db import connections
+from django.db.models import Q, Value, FloatField
+from .models import Product
+
+FTS_TABLE = 'store_product_fts'
+FULLTEXT_INDEX = 'store_product_fulltext'
+MAX_TERMS = 10
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_insert': """
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+    """,
+    f'{FTS_TABLE}_delete': """
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+    """,
+    f'{FTS_TABLE}_update': """
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF title, description ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO {fts}(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+    """,
+}
+
+
+def install_index(connection):
+    """
+    Create the full-text index over product title and description.
+
+    SQLite gets an external content FTS5 table kept in sync by triggers,
+    MySQL a FULLTEXT index that InnoDB maintains itself. Safe to call
+    repeatedly: SQLite drops triggers whenever Django remakes the product
+    table, so missing triggers are recreated and the index rebuilt.
+    """
+    table = Product._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_%'])
+            if {name for name, in cursor.fetchall()} >= SQLITE_TRIGGERS.keys():
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"title, description, content='{table}', content_rowid='id')")
+            for sql in SQLITE_TRIGGERS.values():
+                cursor.execute(sql.format(fts=FTS_TABLE, table=table))
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                f"SHOW INDEX FROM {table} WHERE Key_name = %s", [FULLTEXT_INDEX])
+            if not cursor.fetchall():
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD FULLTEXT INDEX {FULLTEXT_INDEX} (title, description)")
+
+
+def uninstall_index(connection):
+    table = Product._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'mysql':
+            cursor.execute(f'ALTER TABLE {table} DROP INDEX {FULLTEXT_INDEX}')
+
+
+def get_terms(query):
+    return re.findall(r'\w+', query)[:MAX_TERMS]
+
+
+def search_products(queryset, query):
+    """
+    Filter products matching every term of `query` by title or description.
+
+    The result is annotated with `search_rank`, higher is more relevant.
+    The last term is matched as a prefix so results follow the user typing.
+    """
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none()
+
+    table = Product._meta.db_table
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"' for term in terms) + '*'
+        return queryset.extra(
+            select={'search_rank': f'-{FTS_TABLE}.rank'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match])
+    if vendor == 'mysql':
+        match = ' '.join(f'+{term}' for term in terms) + '*'
+        against = f'MATCH ({table}.title, {table}.description) AGAINST (%s IN BOOLEAN MODE)'
+        return queryset.extra(
+            select={'search_rank': against}, select_params=[match],
+            where=[against], params=[match])
+
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term))
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
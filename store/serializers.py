@@ -1,8 +1,15 @@
+from collections import Counter
+from django.conf import settings
 from django.db import transaction
 from rest_framework import serializers
-from .models import Collection, Product, Promotion, Customer, Review, Cart, CartItem, Order, OrderItem, ProductImage
-from .signals import order_created
-from decimal import Decimal
+from rest_framework.exceptions import NotFound
+from .models import Collection, Product, Promotion, Customer, Review, Cart, CartItem, Order, OrderItem, ProductImage, \
+    ProductSalesDay, CollectionSalesDay, CustomerSales
+from .pricing import TAX_RATE
+from .carts import get_cart_store, get_cart_total
+from .inventory import InsufficientStock, reserve_stock
+from .customers import get_customer_id
+from . import outbox, streaming
 
 
 class CollectionSerializer(serializers.ModelSerializer):
@@ -13,8 +20,14 @@ class CollectionSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'products_count']
 
 
+class SimpleCollectionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Collection
+        fields = ['id', 'name']
+
+
 class ProductReadSerializer(serializers.ModelSerializer):
-    collection = CollectionSerializer()
+    collection = SimpleCollectionSerializer()
 
     price_with_tax = serializers.SerializerMethodField(
         method_name='calculate_tax')
@@ -25,15 +38,91 @@ class ProductReadSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'title', 'description', 'price',
-                  'price_with_tax', 'quantity', 'promotion', 'collection']
+                  'price_with_tax', 'effective_price', 'quantity', 'promotion', 'collection']
 
     def calculate_tax(self, product):
-        return product.unit_price * Decimal(1.5)
+        return product.unit_price * TAX_RATE
 
     def convert_price(self, product):
         return int(product.unit_price)
 
 
+class ProductValuesListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        rows = list(data)
+        if 'promotion' in self.child.get_field_names():
+            self.child.attach_promotions(rows)
+        return [self.child.to_representation(row) for row in rows]
+
+
+class ProductValuesSerializer(serializers.BaseSerializer):
+    """
+    Read-only twin of `ProductReadSerializer` working on `values()` rows.
+
+    It renders the same JSON without building model instances or running
+    the per-field machinery of DRF; promotion ids come from one query on
+    the through table for the whole page. A `fields` list in the context
+    restricts both the output and the selected columns.
+    """
+    # output field -> values() columns it reads
+    sources = {
+        'id': ['id'],
+        'title': ['title'],
+        'description': ['description'],
+        'price': ['unit_price'],
+        'price_with_tax': ['unit_price'],
+        'effective_price': ['effective_price'],
+        'quantity': ['quantity'],
+        'promotion': [],
+        'collection': ['collection_id', 'collection__name'],
+    }
+
+    class Meta:
+        list_serializer_class = ProductValuesListSerializer
+
+    @classmethod
+    def get_queryset(cls, queryset, fields=None, extra=()):
+        columns = ['id', *extra]
+        for name in cls.sources if fields is None else fields:
+            columns += cls.sources[name]
+        return queryset.select_related(None).prefetch_related(None).values(
+            *dict.fromkeys(columns))
+
+    def get_field_names(self):
+        fields = self.context.get('fields')
+        return list(self.sources) if fields is None else fields
+
+    @staticmethod
+    def attach_promotions(rows):
+        promotions = {row['id']: [] for row in rows}
+        links = Product.promotion.through.objects.filter(
+            product_id__in=promotions
+        ).order_by('product_id', 'promotion_id').values_list('product_id', 'promotion_id')
+        for product_id, promotion_id in links:
+            promotions[product_id].append(promotion_id)
+        for row in rows:
+            row['promotion'] = promotions[row['id']]
+
+    def to_representation(self, row):
+        fields = self.get_field_names()
+        if 'promotion' in fields and 'promotion' not in row:
+            self.attach_promotions([row])
+        data = {}
+        for name in fields:
+            if name == 'price':
+                data[name] = int(row['unit_price'])
+            elif name == 'price_with_tax':
+                data[name] = row['unit_price'] * TAX_RATE
+            elif name == 'collection':
+                data[name] = {
+                    'id': row['collection_id'],
+                    'name': row['collection__name'],
+                }
+            else:
+                data[name] = row[name]
+        return data
+
+
 class ProductWriteSerializer(serializers.ModelSerializer):
     promotion = serializers.PrimaryKeyRelatedField(
         queryset=Promotion.objects.all(), many=True, required=False, allow_null=True)
@@ -44,6 +133,78 @@ class ProductWriteSerializer(serializers.ModelSerializer):
                   'unit_price', 'quantity', 'promotion', 'collection']
 
 
+class ProductRowSerializer(serializers.ModelSerializer):
+    """
+    Validates one product of an import or a batch write.
+
+    Collections and promotions are checked against the id sets passed in
+    the context instead of one query per row.
+    """
+    id = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    slug = serializers.SlugField(required=False, allow_blank=True, allow_null=True)
+    collection = serializers.IntegerField()
+    promotion = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_null=True)
+
+    class Meta:
+        model = Product
+        fields = ['id', 'title', 'slug', 'description',
+                  'unit_price', 'quantity', 'collection', 'promotion']
+
+    def validate_collection(self, value):
+        if value not in self.context['collection_ids']:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return value
+
+    def validate_promotion(self, value):
+        unknown = [pk for pk in value or [] if pk not in self.context['promotion_ids']]
+        if unknown:
+            raise serializers.ValidationError(f'Invalid pk "{unknown[0]}" - object does not exist.')
+        return value
+
+
+class ProductBatchSerializer(serializers.Serializer):
+    create = ProductRowSerializer(many=True, required=False)
+    update = ProductRowSerializer(many=True, required=False)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def to_internal_value(self, data):
+        # Checked before a single row is validated
+        max_rows = getattr(settings, 'STORE_PRODUCT_BATCH_MAX_ROWS', 1000)
+        if hasattr(data, 'get'):
+            rows = sum(len(value) for value in map(data.get, self.fields)
+                       if isinstance(value, list))
+            if rows > max_rows:
+                raise serializers.ValidationError({'non_field_errors': [
+                    f'A batch may have at most {max_rows} rows, got {rows}.']})
+        return super().to_internal_value(data)
+
+    def validate_create(self, value):
+        # New products get their ids from the database
+        if any(row.get('id') for row in value):
+            raise serializers.ValidationError('Creates must not have an id, use update.')
+        return value
+
+    def validate_update(self, value):
+        if any(not row.get('id') for row in value):
+            raise serializers.ValidationError('Every update needs an id.')
+        return value
+
+    def validate(self, attrs):
+        update_ids = [row['id'] for row in attrs.get('update', [])]
+        delete_ids = attrs.get('delete', [])
+        existing = set(Product.objects.filter(
+            pk__in=update_ids + delete_ids).values_list('pk', flat=True))
+        errors = {}
+        for field, ids in [('update', update_ids), ('delete', delete_ids)]:
+            missing = [pk for pk in ids if pk not in existing]
+            if missing:
+                errors[field] = f'Products not found: {", ".join(map(str, missing))}.'
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
 class SimpleProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
@@ -88,28 +249,17 @@ class AddCartItemSerializer(serializers.ModelSerializer):
 
     # catching errors if product is not found
     def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value):
+        if not Product.objects.filter(pk=value).exists():
             raise serializers.ValidationError('Product not found')
         return value
 
     def save(self, **kwargs):
-        cart_id = self.context['cart_id']
-        product_id = self.validated_data['product_id']
-        quantity = self.validated_data['quantity']
-
-        try:
-            # Updating:
-            # increase quantity when adding same product
-            cart_item = CartItem.objects.get(
-                cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            # Creating
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data)
-
+        # Adding the same product again increases its quantity
+        self.instance = get_cart_store().add_item(
+            self.context['cart_id'], self.validated_data['product_id'],
+            self.validated_data['quantity'])
+        if self.instance is None:
+            raise NotFound('No cart with the given ID was found.')
         return self.instance
 
     class Meta:
@@ -117,6 +267,37 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product_id', 'quantity']
 
 
+class CartItemRowSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CartItemBatchSerializer(serializers.Serializer):
+    items = CartItemRowSerializer(many=True, max_length=100)
+    replace = serializers.BooleanField(default=False)
+
+    def validate_items(self, value):
+        product_ids = {row['product_id'] for row in value}
+        existing = set(Product.objects.filter(
+            pk__in=product_ids).values_list('pk', flat=True))
+        missing = sorted(product_ids - existing)
+        if missing:
+            raise serializers.ValidationError(
+                f'Products not found: {", ".join(map(str, missing))}.')
+        return value
+
+    def save(self, **kwargs):
+        # A product listed twice gets both quantities
+        quantities = Counter()
+        for row in self.validated_data['items']:
+            quantities[row['product_id']] += row['quantity']
+        self.instance = get_cart_store().add_items(
+            self.context['cart_id'], dict(quantities), self.validated_data['replace'])
+        if self.instance is None:
+            raise NotFound('No cart with the given ID was found.')
+        return self.instance
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
@@ -125,10 +306,8 @@ class UpdateCartItemSerializer(serializers.ModelSerializer):
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = SimpleProductSerializer()
-    total_price = serializers.SerializerMethodField()
-
-    def get_total_price(self, cart_item):
-        return cart_item.quantity * cart_item.product.unit_price
+    # Annotated by `CartItem.objects.with_total_price()` or the cart store
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = CartItem
@@ -141,7 +320,7 @@ class CartSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
     def get_total_price(self, cart):
-        return sum([item.quantity * item.product.unit_price for item in cart.items.all()])
+        return get_cart_total(cart.id)
 
     class Meta:
         model = Cart
@@ -168,24 +347,30 @@ class OrderCreationSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
     def validate_cart_id(self, cart_id):
+        cart = get_cart_store().get_cart(cart_id)
         # validate if cart exists
-        if not Cart.objects.filter(pk=cart_id).exists():
+        if cart is None:
             raise serializers.ValidationError(
                 'No cart with the given ID was found.')
         # validate if cart is not empty
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
+        if not cart.items.all():
             raise serializers.ValidationError('The cart is empty.')
         return cart_id
 
     def save(self, **kwargs):
         with transaction.atomic():
             cart_id = self.validated_data['cart_id']
-            customer = Customer.objects.get(user_id=self.context['user_id'])
-
-            order = Order.objects.create(customer_id=customer.id)
-
-            cart_items = CartItem.objects.select_related(
-                'product').filter(cart_id=cart_id)
+            order = Order.objects.create(
+                customer_id=get_customer_id(self.context['user_id']))
+
+            # The cart store drops the cart along with this transaction
+            cart_items = get_cart_store().checkout(cart_id)
+            try:
+                reserve_stock({item.product.id: item.quantity for item in cart_items})
+            except InsufficientStock as error:
+                raise serializers.ValidationError({'cart_id': [
+                    f'Only {available} of product {pk} left, {requested} requested.'
+                    for pk, (requested, available) in error.shortages.items()]})
 
             order_items = [
                 OrderItem(
@@ -198,13 +383,45 @@ class OrderCreationSerializer(serializers.Serializer):
 
             OrderItem.objects.bulk_create(order_items)
 
-            Cart.objects.filter(pk=cart_id).delete()
-
-            order_created.send_robust(self.__class__, order=order)
+            # Receivers run from `manage.py dispatch_outbox` once this commits,
+            # as do the sales rollups, whose rows are shared by every checkout
+            outbox.publish('order_created', order_id=order.id)
+            outbox.publish('sales_rollup', order_ids=[order.id],
+                           payment_status=order.payment_status)
 
             return order
 
 
+class ProductSalesDaySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductSalesDay
+        fields = ['day', 'product', 'payment_status', 'units', 'revenue']
+
+
+class CollectionSalesDaySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CollectionSalesDay
+        fields = ['day', 'collection', 'payment_status', 'units', 'revenue']
+
+
+class CustomerSalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CustomerSales
+        fields = ['customer', 'payment_status', 'orders', 'revenue']
+
+
+class OrderExportSerializer(serializers.Serializer):
+    DATE_FORMATS = ['iso-8601', '%Y-%m-%d']
+
+    file_format = serializers.ChoiceField(choices=streaming.FORMATS, default=streaming.CSV)
+    placed_after = serializers.DateTimeField(required=False, input_formats=DATE_FORMATS)
+    placed_before = serializers.DateTimeField(required=False, input_formats=DATE_FORMATS)
+    payment_status = serializers.ChoiceField(
+        choices=Order.PAYMENT_STATUS_CHOICES, required=False)
+    # Order items read per query
+    chunk_size = serializers.IntegerField(default=2000, min_value=1, max_value=10000)
+
+
 class OrderUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
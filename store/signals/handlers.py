@@ -1,10 +1,168 @@
-from django.db.models.signals import post_save
+from django.db import connections
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed, post_migrate
 from django.dispatch import receiver
 from django.conf import settings
-from store.models import Customer
+from store import cache, counters, customers, pricing, rollups, search
+from store.models import Customer, Order, Product, Collection, Promotion
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_after_creating_new_user(sender, **kwargs):
     if kwargs['created']:
         Customer.objects.create(user=kwargs['instance'])
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, raw, **kwargs):
+    # The sales rollups move an order when its payment status changes.
+    # Locked so a concurrent change of the same order waits and then sees
+    # this one's status, instead of moving the order a second time.
+    instance._previous_payment_status = None
+    if not raw and instance.pk is not None:
+        instance._previous_payment_status = Order.objects.select_for_update().filter(
+            pk=instance.pk).values_list('payment_status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def move_order_sales(sender, instance, created, raw, **kwargs):
+    previous = getattr(instance, '_previous_payment_status', None)
+    if not created and not raw and previous not in (None, instance.payment_status):
+        rollups.move_orders([instance.pk], previous)
+
+
+@receiver(pre_save, sender=Customer)
+def remember_customer_user(sender, instance, raw, **kwargs):
+    # A customer moved to another user must drop the old user's mapping
+    instance._previous_user_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_user_id = Customer.objects.filter(
+            pk=instance.pk).values_list('user_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Customer)
+def forget_customer_user(sender, instance, **kwargs):
+    user_ids = {instance.user_id, getattr(instance, '_previous_user_id', None)}
+    customers.forget_customer_id(*(user_id for user_id in user_ids if user_id is not None))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    cache.bump(cache.PRODUCTS, cache.COLLECTIONS,
+               cache.product_namespace(instance.pk))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_collection(sender, instance, update_fields, raw, **kwargs):
+    # The counter of the collection a product leaves has to go down
+    instance._previous_collection_id = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and 'collection' not in update_fields:
+        instance._previous_collection_id = instance.collection_id
+        return
+    instance._previous_collection_id = Product.objects.filter(
+        pk=instance.pk).values_list('collection_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_collection_id', None)
+    if created:
+        counters.adjust_products_count({instance.collection_id: 1})
+    elif previous is not None and previous != instance.collection_id:
+        counters.adjust_products_count({previous: -1, instance.collection_id: 1})
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    counters.adjust_products_count({instance.collection_id: -1})
+
+
+@receiver(m2m_changed, sender=Product.promotion.through)
+def invalidate_product_promotions_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    # Promotion ids are part of the product document, so its validators move
+    if reverse and action == 'pre_clear':
+        Product.objects.filter(promotion=instance).touch()
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        if pk_set:
+            Product.objects.filter(pk__in=pk_set).touch()
+        # promotion.product_set changes can touch any number of products
+        cache.bump(cache.PRODUCTS, cache.CATALOG)
+    else:
+        Product.objects.filter(pk=instance.pk).touch()
+        cache.bump(cache.PRODUCTS, cache.product_namespace(instance.pk))
+
+
+@receiver(m2m_changed, sender=Product.promotion.through)
+def reprice_linked_products(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            pricing.refresh_effective_prices(Product.objects.filter(pk=instance.pk))
+    elif action == 'pre_clear':
+        instance._cleared_product_ids = list(
+            instance.product_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        pricing.refresh_effective_prices(
+            Product.objects.filter(pk__in=instance._cleared_product_ids))
+    elif action.startswith('post_') and pk_set:
+        pricing.refresh_effective_prices(Product.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Promotion)
+def reprice_promotion_products(sender, instance, created, raw, **kwargs):
+    # A new promotion isn't linked to any product yet
+    if not created and not raw:
+        products = Product.objects.filter(promotion=instance)
+        pricing.refresh_effective_prices(products)
+        products.touch()
+
+
+@receiver(pre_delete, sender=Promotion)
+def remember_promotion_products(sender, instance, **kwargs):
+    # The links are gone by post_delete
+    instance._product_ids = list(instance.product_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Promotion)
+def reprice_former_promotion_products(sender, instance, **kwargs):
+    # Their promotion ids and prices changed, so their validators move
+    products = Product.objects.filter(pk__in=instance._product_ids)
+    pricing.refresh_effective_prices(products)
+    products.touch()
+
+
+@receiver(pre_save, sender=Collection)
+def remember_collection_name(sender, instance, update_fields, raw, **kwargs):
+    instance._previous_name = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and 'name' not in update_fields:
+        instance._previous_name = instance.name
+        return
+    instance._previous_name = Collection.objects.filter(
+        pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Collection)
+def touch_collection_products(sender, instance, created, **kwargs):
+    # Products embed their collection's name, and nothing else of it
+    previous = getattr(instance, '_previous_name', None)
+    if not created and previous is not None and previous != instance.name:
+        Product.objects.filter(collection=instance).touch()
+
+
+@receiver([post_save, post_delete], sender=Collection)
+@receiver([post_save, post_delete], sender=Promotion)
+def invalidate_catalog_cache(sender, **kwargs):
+    cache.bump(cache.PRODUCTS, cache.COLLECTIONS, cache.CATALOG)
+
+
+@receiver(post_migrate)
+def ensure_product_search_index(sender, using, **kwargs):
+    # SQLite drops the sync triggers whenever a migration remakes the table
+    if sender.name == 'store':
+        search.install_index(connections[using])
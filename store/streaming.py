@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = [CSV, NDJSON]
+
+CONTENT_TYPES = {
+    CSV: 'text/csv',
+    NDJSON: 'application/x-ndjson',
+}
+
+
+class Echo:
+    """Pseudo-buffer handing each line written by `csv.writer` back."""
+
+    def write(self, value):
+        return value
+
+
+def to_csv(fields, rows, list_separator='|'):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([
+            list_separator.join(map(str, value)) if isinstance(value, list)
+            else '' if value is None else value
+            for value in (row[field] for field in fields)
+        ])
+
+
+def to_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def encode(fields, rows, file_format):
+    if file_format == CSV:
+        return to_csv(fields, rows)
+    return to_ndjson(rows)
+
+
+def streaming_response(fields, rows, file_format, filename):
+    response = StreamingHttpResponse(
+        encode(fields, rows, file_format), content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+def decode(stream, file_format, list_fields=(), list_separator='|'):
+    """
+    Yield one dict per CSV/NDJSON line of a binary or text stream.
+
+    Lines are read lazily so arbitrarily large files use constant memory.
+    Empty CSV cells become None and `list_fields` are split into lists.
+    Malformed NDJSON lines are yielded as the `ValueError` they raised.
+    """
+    if isinstance(stream, io.TextIOBase):
+        lines = stream
+    else:
+        lines = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    if file_format == CSV:
+        for row in csv.DictReader(lines):
+            for field, value in row.items():
+                if field in list_fields:
+                    row[field] = [item for item in (value or '').split(list_separator) if item]
+                elif value == '':
+                    row[field] = None
+            yield row
+    else:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield error
@@ -1,6 +1,8 @@
 from rest_framework.test import APIClient
 from django.contrib.auth.models import User
 from model_bakery import baker
+from django.core.cache import cache
+from .fakes import FakeRedis
 import pytest
 
 
@@ -21,3 +23,21 @@ def create_instance(request):
     def do_create_instance():
         return baker.make(request.cls.model)
     return do_create_instance
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(settings):
+    # Stand in for Redis with an in-memory L2 behind the two-tier cache
+    settings.CACHES = {
+        **settings.CACHES,
+        'redis': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    # Carts are kept in Redis, see `store.carts.RedisCartStore`
+    client = FakeRedis()
+    monkeypatch.setattr('store.carts.get_redis_connection', lambda alias: client)
+    return client
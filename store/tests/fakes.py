@@ -0,0 +1,142 @@
+import threading
+import time
+
+
+def _bytes(value):
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the redis-py client, covering the commands the
+    store uses. Values come back as bytes like they do from Redis, and
+    `advance(seconds)` moves the clock keys expire against.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.offset = 0
+        self.lock = threading.RLock()
+
+    def advance(self, seconds):
+        self.offset += seconds
+
+    def _now(self):
+        return time.time() + self.offset
+
+    def _get(self, key):
+        key = _bytes(key)
+        if key in self.expires and self.expires[key] <= self._now():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _hash(self, key):
+        value = self._get(key)
+        if value is None:
+            value = self.data[_bytes(key)] = {}
+        return value
+
+    def ttl(self, key):
+        with self.lock:
+            if self._get(key) is None:
+                return -2
+            if _bytes(key) not in self.expires:
+                return -1
+            return int(self.expires[_bytes(key)] - self._now())
+
+    def exists(self, *keys):
+        with self.lock:
+            return sum(self._get(key) is not None for key in keys)
+
+    def delete(self, *keys):
+        with self.lock:
+            deleted = 0
+            for key in keys:
+                if self._get(key) is not None:
+                    del self.data[_bytes(key)]
+                    self.expires.pop(_bytes(key), None)
+                    deleted += 1
+            return deleted
+
+    def expire(self, key, seconds):
+        with self.lock:
+            if self._get(key) is None:
+                return False
+            self.expires[_bytes(key)] = self._now() + seconds
+            return True
+
+    def incr(self, key, amount=1):
+        with self.lock:
+            value = int(self._get(key) or 0) + amount
+            self.data[_bytes(key)] = _bytes(value)
+            return value
+
+    def hget(self, key, field):
+        with self.lock:
+            return (self._get(key) or {}).get(_bytes(field))
+
+    def hgetall(self, key):
+        with self.lock:
+            return dict(self._get(key) or {})
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self.lock:
+            values = self._hash(key)
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added = 0
+            for field, value in items.items():
+                added += _bytes(field) not in values
+                values[_bytes(field)] = _bytes(value)
+            return added
+
+    def hsetnx(self, key, field, value):
+        with self.lock:
+            values = self._hash(key)
+            if _bytes(field) in values:
+                return 0
+            values[_bytes(field)] = _bytes(value)
+            return 1
+
+    def hincrby(self, key, field, amount=1):
+        with self.lock:
+            values = self._hash(key)
+            total = int(values.get(_bytes(field), 0)) + amount
+            values[_bytes(field)] = _bytes(total)
+            return total
+
+    def hdel(self, key, *fields):
+        with self.lock:
+            values = self._get(key) or {}
+            deleted = sum(values.pop(_bytes(field), None) is not None for field in fields)
+            if not values:
+                self.delete(key)
+            return deleted
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queue commands and run them under the client lock on `execute()`."""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self.client.lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return results
@@ -0,0 +1,69 @@
+from decimal import Decimal
+from store.models import Product, Collection, Promotion
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductCache:
+    endpoint = '/store/products/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.collection = baker.make(Collection, name='old')
+        self.product = baker.make(
+            Product, collection=self.collection, unit_price=Decimal(10), quantity=5)
+
+    def get_detail(self, api_client):
+        return api_client.get(f'{self.endpoint}{self.product.id}/').data
+
+    def test_detail_is_served_from_cache(self, api_client, django_assert_num_queries):
+        self.get_detail(api_client)
+
+        with django_assert_num_queries(0):
+            response = api_client.get(f'{self.endpoint}{self.product.id}/')
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_save_invalidates_detail_and_list(self, api_client):
+        self.get_detail(api_client)
+        api_client.get(self.endpoint)
+
+        self.product.unit_price = Decimal(20)
+        self.product.save()
+
+        assert self.get_detail(api_client)['price'] == 20
+        assert api_client.get(self.endpoint).data['results'][0]['price'] == 20
+
+    def test_queryset_update_invalidates_detail(self, api_client):
+        self.get_detail(api_client)
+
+        Product.objects.filter(pk=self.product.pk).update(quantity=0)
+
+        assert self.get_detail(api_client)['quantity'] == 0
+
+    def test_promotion_change_invalidates_detail(self, api_client):
+        self.get_detail(api_client)
+        promotion = baker.make(Promotion)
+
+        self.product.promotion.add(promotion)
+        assert self.get_detail(api_client)['promotion'] == [promotion.id]
+
+        promotion.delete()
+        assert self.get_detail(api_client)['promotion'] == []
+
+    def test_collection_rename_invalidates_detail(self, api_client):
+        self.get_detail(api_client)
+
+        self.collection.name = 'new'
+        self.collection.save()
+
+        assert self.get_detail(api_client)['collection']['name'] == 'new'
+
+    def test_product_creation_invalidates_collection_list(self, api_client):
+        api_client.get('/store/collections/')
+
+        baker.make(Product, collection=self.collection)
+
+        response = api_client.get('/store/collections/')
+        assert response.data[0]['products_count'] == 2
@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.cache import caches
+from store.cache_backends import TwoTierCache
+import threading
+import time
+import pytest
+
+
+class TestTwoTierCache:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.l2 = caches['redis']
+        self.cache = self.make_cache()
+
+    def make_cache(self, location=None, **options):
+        return TwoTierCache(location, {'OPTIONS': {
+            'L2_CACHE': 'redis',
+            'L1_EXCLUDE': ['counter:'],
+            'POLL_INTERVAL': 0.01,
+            **options
+        }})
+
+    def other_process(self):
+        # Separate L1 and in-flight loads, same L2
+        return self.make_cache('other-process')
+
+    def test_set_writes_through_to_l2(self):
+        self.cache.set('key', 'value', 60)
+
+        assert self.other_process().get('key') == 'value'
+
+    def test_l1_serves_hits_without_l2(self):
+        self.cache.set('key', 'value', 60)
+        self.l2.clear()
+
+        assert self.cache.get('key') == 'value'
+
+    def test_l1_is_bounded(self):
+        cache = self.make_cache(L1_MAX_ENTRIES=2)
+        for key in ['a', 'b', 'c']:
+            cache.set(key, key, 60)
+        self.l2.clear()
+
+        assert cache.get('a') is None
+        assert cache.get('c') == 'c'
+
+    def test_l1_entries_expire_after_l1_timeout(self):
+        cache = self.make_cache(L1_TIMEOUT=0.05)
+        cache.set('key', 'old', 60)
+        self.other_process().set('key', 'new', 60)
+
+        time.sleep(0.1)
+
+        assert cache.get('key') == 'new'
+
+    def test_excluded_keys_are_always_read_from_l2(self):
+        self.cache.set('counter:a', 1, None)
+        self.cache.get('counter:a')
+        self.other_process().incr('counter:a')
+
+        assert self.cache.get('counter:a') == 2
+
+    def test_expiring_excluded_keys_can_be_incremented(self):
+        self.cache.add('counter:a', 1, 0.05)
+        self.cache.incr('counter:a')
+
+        assert self.cache.get('counter:a') == 2
+        time.sleep(0.1)
+        assert self.cache.get('counter:a') is None
+
+    def test_l1_is_shared_by_the_instances_of_each_thread(self):
+        instances = []
+
+        def set_value():
+            instances.append(caches['default'])
+            caches['default'].set('key', 'value', 60)
+        thread = threading.Thread(target=set_value)
+        thread.start()
+        thread.join()
+        self.l2.clear()
+
+        assert instances[0] is not caches['default']
+        assert caches['default'].get('key') == 'value'
+
+    def test_get_or_set_coalesces_concurrent_misses(self, settings):
+        # Waiting through the L2 lock would poll once `POLL_INTERVAL` is up
+        default = settings.CACHES['default']
+        settings.CACHES = {**settings.CACHES, 'default': {
+            **default, 'OPTIONS': {**default['OPTIONS'], 'POLL_INTERVAL': 5}}}
+        calls = []
+        instances = set()
+        barrier = threading.Barrier(8)
+
+        def load():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        def get(_):
+            # Each request thread gets its own backend instance
+            cache = caches['default']
+            instances.add(id(cache))
+            barrier.wait()
+            return cache.get_or_set('product', load, 60)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(get, range(8)))
+
+        assert time.monotonic() - started < 1
+        assert len(instances) == 8
+        assert results == ['value'] * 8
+        assert len(calls) == 1
+
+    def test_get_or_set_waits_for_another_process_holding_the_lock(self):
+        other = self.other_process()
+        self.l2.add('product:lock', 1, 10)
+        threading.Timer(0.05, lambda: other.set('product', 'theirs', 60)).start()
+
+        assert self.cache.get_or_set('product', lambda: 'ours', 60) == 'theirs'
+
+    def test_stale_value_is_served_while_revalidating(self):
+        cache = self.make_cache(STALE_TIMEOUT=60, L1_TIMEOUT=0)
+        cache.set('key', 'old', 0.05)
+        time.sleep(0.1)
+        refreshed = threading.Event()
+
+        def load():
+            refreshed.set()
+            return 'new'
+
+        assert cache.get('key') is None
+        assert cache.get_or_set('key', load, 60) == 'old'
+        assert refreshed.wait(1)
+        time.sleep(0.05)
+        assert cache.get('key') == 'new'
@@ -0,0 +1,405 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from uuid import uuid4
+from django.conf import settings as django_settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from store.cache import VERSION_KEY, cart_namespace
+from store.carts import DatabaseCartStore, get_cart_store, purge_carts
+from store.management.commands.purge_carts import CHECKPOINT_KEY
+from store.models import Cart, CartItem, Order, Product
+from model_bakery import baker
+import pytest
+
+STORES = ['store.carts.DatabaseCartStore', 'store.carts.RedisCartStore']
+
+
+@pytest.fixture(params=STORES, ids=['database', 'redis'])
+def cart_store(request, settings):
+    settings.STORE_CART_STORE = request.param
+    return get_cart_store()
+
+
+@pytest.mark.django_db
+class TestCartApi:
+    @pytest.fixture(autouse=True)
+    def setup(self, cart_store, api_client):
+        self.products = baker.make(Product, unit_price=Decimal('2.50'), quantity=10, _quantity=2)
+        self.cart_id = api_client.post('/store/carts/').data['id']
+        self.items = f'/store/carts/{self.cart_id}/items/'
+
+    def add(self, api_client, product, quantity=1):
+        return api_client.post(self.items, {'product_id': product.id, 'quantity': quantity})
+
+    def test_create_returns_an_empty_cart(self, api_client):
+        response = api_client.get(f'/store/carts/{self.cart_id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['items'] == []
+        assert response.data['total_price'] == 0
+
+    def test_adding_a_product_twice_increases_the_quantity(self, api_client):
+        first = self.add(api_client, self.products[0], 2)
+        second = self.add(api_client, self.products[0], 3)
+
+        assert first.status_code == status.HTTP_201_CREATED
+        assert second.data == {'id': first.data['id'],
+                               'product_id': self.products[0].id, 'quantity': 5}
+
+    def test_retrieve_renders_items_and_totals(self, api_client):
+        self.add(api_client, self.products[0], 2)
+        self.add(api_client, self.products[1], 1)
+
+        response = api_client.get(f'/store/carts/{self.cart_id}/')
+
+        assert [item['quantity'] for item in response.data['items']] == [2, 1]
+        assert response.data['items'][0]['product'] == {
+            'id': self.products[0].id, 'title': self.products[0].title,
+            'description': self.products[0].description, 'unit_price': Decimal('2.50')}
+        assert response.data['items'][0]['total_price'] == Decimal('5.00')
+        assert response.data['total_price'] == Decimal('7.50')
+
+    def test_update_and_delete_items(self, api_client):
+        item_id = self.add(api_client, self.products[0]).data['id']
+
+        patched = api_client.patch(f'{self.items}{item_id}/', {'quantity': 4})
+        assert patched.data == {'quantity': 4}
+        assert api_client.get(f'{self.items}{item_id}/').data['quantity'] == 4
+
+        deleted = api_client.delete(f'{self.items}{item_id}/')
+        assert deleted.status_code == status.HTTP_204_NO_CONTENT
+        assert api_client.get(self.items).data == []
+
+    def test_unknown_cart_and_item_return_404(self, api_client):
+        assert api_client.get('/store/carts/not-a-uuid/').status_code == status.HTTP_404_NOT_FOUND
+        assert api_client.get(
+            '/store/carts/00000000-0000-0000-0000-000000000000/'
+        ).status_code == status.HTTP_404_NOT_FOUND
+        assert api_client.get(f'{self.items}0/').status_code == status.HTTP_404_NOT_FOUND
+
+    def test_adding_to_an_unknown_cart_returns_404(self, api_client):
+        response = api_client.post(
+            '/store/carts/00000000-0000-0000-0000-000000000000/items/',
+            {'product_id': self.products[0].id, 'quantity': 1})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert not CartItem.objects.exists()
+
+    def test_invalid_product_returns_400(self, api_client):
+        response = api_client.post(self.items, {'product_id': 0, 'quantity': 1})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_delete_cart(self, api_client):
+        response = api_client.delete(f'/store/carts/{self.cart_id}/')
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert api_client.get(f'/store/carts/{self.cart_id}/').status_code == status.HTTP_404_NOT_FOUND
+
+    def test_checkout_creates_the_order_and_drops_the_cart(
+            self, api_client, django_capture_on_commit_callbacks):
+        self.add(api_client, self.products[0], 2)
+        user = baker.make(django_settings.AUTH_USER_MODEL)
+        api_client.force_authenticate(user=user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post('/store/orders/', {'cart_id': self.cart_id})
+
+        assert response.status_code == status.HTTP_200_OK
+        order = Order.objects.get(pk=response.data['id'])
+        assert [(item.product_id, item.quantity, item.unit_price) for item in order.items.all()] == [
+            (self.products[0].id, 2, Decimal('2.50'))]
+        assert api_client.get(f'/store/carts/{self.cart_id}/').status_code == status.HTTP_404_NOT_FOUND
+
+    def test_checkout_of_an_empty_cart_returns_400(self, api_client):
+        api_client.force_authenticate(user=baker.make(django_settings.AUTH_USER_MODEL))
+
+        response = api_client.post('/store/orders/', {'cart_id': self.cart_id})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestCartItemBatch:
+    @pytest.fixture(autouse=True)
+    def setup(self, cart_store, api_client):
+        self.products = baker.make(Product, unit_price=Decimal('2.50'), quantity=10, _quantity=3)
+        self.cart_id = api_client.post('/store/carts/').data['id']
+        self.batch = f'/store/carts/{self.cart_id}/items/batch/'
+
+    def rows(self, *quantities):
+        return [{'product_id': product.id, 'quantity': quantity}
+                for product, quantity in zip(self.products, quantities)]
+
+    def contents(self, response):
+        return [(item['product']['id'], item['quantity']) for item in response.data['items']]
+
+    def test_adds_every_item_and_returns_the_cart(self, api_client):
+        api_client.post(f'/store/carts/{self.cart_id}/items/',
+                        {'product_id': self.products[0].id, 'quantity': 1})
+
+        response = api_client.post(self.batch, {'items': self.rows(2, 3)}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == self.cart_id
+        assert self.contents(response) == [(self.products[0].id, 3), (self.products[1].id, 3)]
+        assert response.data['total_price'] == Decimal('15.00')
+
+    def test_accepts_a_bare_list_and_merges_repeated_products(self, api_client):
+        rows = self.rows(2) + self.rows(3)
+
+        response = api_client.post(self.batch, rows, format='json')
+
+        assert self.contents(response) == [(self.products[0].id, 5)]
+
+    def test_replace_leaves_only_the_given_items(self, api_client):
+        api_client.post(self.batch, self.rows(2, 3), format='json')
+
+        response = api_client.post(
+            self.batch, {'items': self.rows(0, 1, 4)[1:], 'replace': True}, format='json')
+
+        assert self.contents(response) == [(self.products[1].id, 1), (self.products[2].id, 4)]
+        assert self.contents(api_client.get(f'/store/carts/{self.cart_id}/')) == [
+            (self.products[1].id, 1), (self.products[2].id, 4)]
+
+    def test_unknown_products_reject_the_whole_batch(self, api_client):
+        rows = self.rows(1) + [{'product_id': 0, 'quantity': 1}]
+
+        response = api_client.post(self.batch, rows, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['items'] == ['Products not found: 0.']
+        assert api_client.get(f'/store/carts/{self.cart_id}/').data['items'] == []
+
+    def test_unknown_cart_returns_404(self, api_client):
+        response = api_client.post(
+            '/store/carts/00000000-0000-0000-0000-000000000000/items/batch/',
+            self.rows(1), format='json')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestCartTotals:
+    @pytest.fixture(autouse=True)
+    def setup(self, cart_store, api_client):
+        self.product = baker.make(Product, unit_price=Decimal('2.50'), quantity=10)
+        self.cart_id = api_client.post('/store/carts/').data['id']
+        self.cart = f'/store/carts/{self.cart_id}/'
+        self.item_id = api_client.post(
+            f'{self.cart}items/', {'product_id': self.product.id, 'quantity': 3}).data['id']
+
+    def total(self, api_client):
+        return api_client.get(self.cart, {'fields': 'total_price'}).data['total_price']
+
+    def test_item_changes_refresh_the_cached_total(self, api_client):
+        assert self.total(api_client) == Decimal('7.50')
+
+        api_client.patch(f'{self.cart}items/{self.item_id}/', {'quantity': 4})
+        assert self.total(api_client) == Decimal('10.00')
+
+        api_client.delete(f'{self.cart}items/{self.item_id}/')
+        assert self.total(api_client) == 0
+
+    def test_price_changes_refresh_the_cached_total(self, api_client):
+        assert self.total(api_client) == Decimal('7.50')
+
+        self.product.unit_price = Decimal('3.00')
+        self.product.save()
+
+        assert self.total(api_client) == Decimal('9.00')
+        assert api_client.get(f'{self.cart}items/').data[0]['total_price'] == Decimal('9.00')
+
+    def test_cart_versions_expire_with_the_cart(self, api_client, settings):
+        self.total(api_client)
+        api_client.patch(f'{self.cart}items/{self.item_id}/', {'quantity': 4})
+
+        l2 = caches['redis']
+        key = l2.make_key(VERSION_KEY.format(cart_namespace(self.cart_id)))
+        ttl = l2._expire_info[key] - time.time()
+        assert settings.STORE_CART_TTL - 60 < ttl <= settings.STORE_CART_TTL
+
+    def test_polling_the_total_reads_the_cache(self, api_client, django_assert_num_queries):
+        self.total(api_client)
+
+        # Only the cart itself is read, not its total
+        with django_assert_num_queries(1):
+            assert self.total(api_client) == Decimal('7.50')
+
+
+@pytest.mark.django_db
+def test_totals_are_computed_by_the_database(settings, django_assert_num_queries):
+    settings.STORE_CART_STORE = 'store.carts.DatabaseCartStore'
+    cart = baker.make(Cart)
+    baker.make(CartItem, cart=cart, quantity=2, product__unit_price=Decimal('1.25'))
+    baker.make(CartItem, cart=cart, quantity=1, product__unit_price=Decimal('4.00'))
+
+    with django_assert_num_queries(1):
+        assert get_cart_store().get_total_price(cart.id) == Decimal('6.50')
+    with django_assert_num_queries(1):
+        totals = [item.total_price for item in CartItem.objects.with_total_price().order_by('id')]
+    assert totals == [Decimal('2.50'), Decimal('4.00')]
+
+
+@pytest.mark.django_db
+def test_batch_checks_products_and_writes_items_in_one_statement_each(
+        settings, api_client, django_assert_max_num_queries):
+    settings.STORE_CART_STORE = 'store.carts.DatabaseCartStore'
+    products = baker.make(Product, quantity=1, _quantity=20)
+    cart = get_cart_store().create_cart()
+
+    with django_assert_max_num_queries(10) as captured:
+        response = api_client.post(
+            f'/store/carts/{cart.id}/items/batch/',
+            [{'product_id': product.id, 'quantity': 1} for product in products], format='json')
+
+    statements = [query['sql'] for query in captured.captured_queries]
+    assert len(response.data['items']) == 20
+    assert sum(sql.startswith('INSERT') for sql in statements) == 1
+    # One lookup validates every product id before anything is written
+    assert statements[0].startswith('SELECT "store_product"."id"') and ' IN (' in statements[0]
+
+
+@pytest.mark.django_db
+class TestPurgeCarts:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.old = baker.make(Cart, _quantity=5)
+        Cart.objects.update(created_at=timezone.now() - timedelta(days=40))
+        self.recent = baker.make(Cart)
+        for cart in self.old + [self.recent]:
+            baker.make(CartItem, cart=cart, quantity=1)
+
+    def purge(self, **options):
+        out = StringIO()
+        call_command('purge_carts', stdout=out, **options)
+        return out.getvalue()
+
+    def test_deletes_old_carts_and_their_items_in_batches(self):
+        output = self.purge(batch_size=2, verbosity=2)
+
+        assert list(Cart.objects.all()) == [self.recent]
+        assert list(CartItem.objects.values_list('cart_id', flat=True)) == [self.recent.id]
+        assert 'Batch 3: 1 carts, 1 items.' in output
+        assert 'Deleted 5 carts and 5 items' in output
+
+    def test_dry_run_only_counts(self):
+        output = self.purge(dry_run=True)
+
+        assert Cart.objects.count() == 6
+        assert 'Would delete 5 carts and 5 items' in output
+
+    def test_resumes_after_the_checkpoint(self):
+        ids = sorted(cart.id for cart in self.old)
+        cache.set(CHECKPOINT_KEY, ids[2], None)
+
+        output = self.purge()
+
+        assert f'Resuming after cart {ids[2]}.' in output
+        assert sorted(Cart.objects.values_list('pk', flat=True)) == sorted(ids[:3] + [self.recent.id])
+        assert cache.get(CHECKPOINT_KEY) is None
+
+    def test_interrupted_run_leaves_a_checkpoint(self, monkeypatch):
+        ids = sorted(cart.id for cart in self.old)
+        batches = []
+
+        def interrupt(batch):
+            if batches:
+                raise KeyboardInterrupt
+            batches.append(batch)
+            return purge_carts(batch)
+        monkeypatch.setattr('store.management.commands.purge_carts.purge_carts', interrupt)
+
+        with pytest.raises(KeyboardInterrupt):
+            self.purge(batch_size=2)
+
+        assert cache.get(CHECKPOINT_KEY) == ids[1]
+        assert Cart.objects.count() == 4
+
+
+@pytest.mark.django_db
+class TestRedisCartStore:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.STORE_CART_STORE = 'store.carts.RedisCartStore'
+        settings.STORE_CART_TTL = 60
+        self.store = get_cart_store()
+        self.product = baker.make(Product, quantity=1)
+
+    def test_carts_never_touch_the_cart_tables(self, api_client):
+        cart_id = api_client.post('/store/carts/').data['id']
+        api_client.post(f'/store/carts/{cart_id}/items/', {'product_id': self.product.id, 'quantity': 1})
+
+        assert not Cart.objects.exists()
+        assert not CartItem.objects.exists()
+
+    def test_carts_expire_after_their_last_change(self, fake_redis):
+        cart = self.store.create_cart()
+        fake_redis.advance(45)
+        self.store.add_item(cart.id, self.product.id, 1)
+        fake_redis.advance(45)
+
+        assert self.store.get_cart(cart.id) is not None
+
+        fake_redis.advance(20)
+
+        assert self.store.get_cart(cart.id) is None
+        assert self.store.add_item(cart.id, self.product.id, 1) is None
+
+    def test_deleted_products_drop_out_of_the_cart(self):
+        cart = self.store.create_cart()
+        self.store.add_item(cart.id, self.product.id, 1)
+        self.product.delete()
+
+        assert self.store.get_items(cart.id) == []
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentAdds:
+    def test_parallel_adds_to_one_cart_are_all_counted(self, cart_store, api_client):
+        if isinstance(cart_store, DatabaseCartStore) and connection.vendor == 'sqlite' \
+                and connection.is_in_memory_db():
+            pytest.skip('In-memory SQLite fails concurrent writers instead of making them wait')
+        product = baker.make(Product, quantity=1)
+        cart_id = api_client.post('/store/carts/').data['id']
+        barrier = threading.Barrier(8)
+
+        def add(_):
+            try:
+                barrier.wait()
+                return APIClient().post(
+                    f'/store/carts/{cart_id}/items/', {'product_id': product.id, 'quantity': 2}
+                ).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            statuses = list(executor.map(add, range(8)))
+
+        assert statuses == [status.HTTP_201_CREATED] * 8
+        items = cart_store.get_items(cart_id)
+        assert [(item.product.id, item.quantity) for item in items] == [(product.id, 16)]
+
+    def test_adds_run_in_one_statement(self, settings, django_assert_num_queries):
+        settings.STORE_CART_STORE = 'store.carts.DatabaseCartStore'
+        store = get_cart_store()
+        product = baker.make(Product, quantity=1)
+        cart = store.create_cart()
+
+        with django_assert_num_queries(1):
+            first = store.add_item(cart.id, product.id, 1)
+        with django_assert_num_queries(1):
+            second = store.add_item(cart.id, product.id, 2)
+
+        assert (second.id, second.quantity) == (first.id, 3)
+        # A missing cart is checked by the same statement
+        with django_assert_num_queries(1):
+            assert store.add_item(uuid4(), product.id, 1) is None
@@ -0,0 +1,106 @@
+import io
+from decimal import Decimal
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from store.models import Collection, Product
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+
+def counts(*collections):
+    return [Collection.objects.get(pk=collection.pk).products_count for collection in collections]
+
+
+@pytest.mark.django_db
+class TestProductsCount:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.shoes, self.hats = baker.make(Collection, _quantity=2)
+        self.products = baker.make(Product, collection=self.shoes,
+                                   unit_price=Decimal(5), quantity=1, _quantity=3)
+
+    def test_create_and_delete(self):
+        assert counts(self.shoes, self.hats) == [3, 0]
+
+        self.products[0].delete()
+
+        assert counts(self.shoes, self.hats) == [2, 0]
+
+    def test_moving_a_product(self):
+        product = self.products[0]
+        product.collection = self.hats
+        product.save()
+
+        assert counts(self.shoes, self.hats) == [2, 1]
+
+        product.title = 'Renamed'
+        product.save()
+
+        assert counts(self.shoes, self.hats) == [2, 1]
+
+    def test_queryset_update_and_delete(self):
+        Product.objects.filter(pk__in=[self.products[0].pk, self.products[1].pk]).update(
+            collection=self.hats)
+
+        assert counts(self.shoes, self.hats) == [1, 2]
+
+        Product.objects.filter(collection=self.hats).delete()
+
+        assert counts(self.shoes, self.hats) == [1, 0]
+
+    def test_stale_collection_save_keeps_the_count(self):
+        collection = Collection.objects.get(pk=self.hats.pk)
+        baker.make(Product, collection=self.hats)
+        collection.name = 'Caps'
+        collection.save()
+
+        assert counts(self.hats) == [1]
+
+    def test_batch_endpoint(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        row = {'title': 'Product', 'unit_price': '12.00', 'quantity': 4}
+
+        response = api_client.post('/store/products/batch/', {
+            'create': [{**row, 'collection': self.hats.id}] * 2,
+            'update': [{**row, 'id': self.products[0].id, 'collection': self.hats.id}],
+            'delete': [self.products[1].id],
+        }, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert counts(self.shoes, self.hats) == [1, 3]
+
+    def test_import(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        upload = io.BytesIO(
+            b'title,unit_price,quantity,collection\n'
+            + f'Cap,3.00,1,{self.hats.id}\n'.encode() * 2)
+        upload.name = 'products.csv'
+
+        api_client.post('/store/products/import/', {'file': upload}, format='multipart')
+
+        assert counts(self.shoes, self.hats) == [3, 2]
+
+    def test_collections_are_ordered_by_count(self, api_client):
+        response = api_client.get('/store/collections/', {'ordering': '-products_count'})
+
+        assert [(c['id'], c['products_count']) for c in response.data] == [
+            (self.shoes.id, 3), (self.hats.id, 0)]
+
+
+@pytest.mark.django_db
+class TestRebuildProductsCountCommand:
+    def test_verify_reports_and_rebuild_fixes(self):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+        Collection.objects.filter(pk=collection.pk).update(products_count=5)
+        out = io.StringIO()
+
+        with pytest.raises(CommandError):
+            call_command('rebuild_products_count', verify=True, stdout=out)
+        assert 'stored 5, actual 2' in out.getvalue()
+
+        call_command('rebuild_products_count', stdout=out)
+        call_command('rebuild_products_count', verify=True, stdout=out)
+
+        assert counts(collection) == [2]
@@ -0,0 +1,122 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from rest_framework import status
+from rest_framework.test import APIClient
+from store.models import IdempotencyKey, Order, Product
+from model_bakery import baker
+import pytest
+
+
+def make_cart(client, product, quantity=1):
+    cart_id = client.post('/store/carts/').data['id']
+    client.post(f'/store/carts/{cart_id}/items/',
+                {'product_id': product.id, 'quantity': quantity})
+    return cart_id
+
+
+def place_order(client, cart_id, key):
+    return client.post('/store/orders/', {'cart_id': cart_id}, HTTP_IDEMPOTENCY_KEY=key)
+
+
+@pytest.mark.django_db
+class TestIdempotentOrders:
+    @pytest.fixture(autouse=True)
+    def setup(self, api_client):
+        self.product = baker.make(Product, quantity=10)
+        self.user = baker.make(settings.AUTH_USER_MODEL)
+        api_client.force_authenticate(user=self.user)
+
+    def test_retries_replay_the_first_response(self, api_client):
+        cart_id = make_cart(api_client, self.product)
+
+        first = place_order(api_client, cart_id, 'order-1')
+        retry = place_order(api_client, cart_id, 'order-1')
+
+        assert first.status_code == retry.status_code == status.HTTP_200_OK
+        assert retry.content == first.content
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert 'Idempotent-Replayed' not in first
+        assert Order.objects.count() == 1
+        assert Product.objects.get(pk=self.product.id).quantity == 9
+
+    def test_replays_read_only_the_key(self, api_client, django_assert_num_queries):
+        cart_id = make_cart(api_client, self.product)
+        place_order(api_client, cart_id, 'order-1')
+
+        with django_assert_num_queries(3) as captured:
+            place_order(api_client, cart_id, 'order-1')
+
+        # The key lookup, within a savepoint
+        statements = [query['sql'] for query in captured.captured_queries
+                      if 'SAVEPOINT' not in query['sql']]
+        assert len(statements) == 1
+        assert '"store_idempotencykey"' in statements[0]
+
+    def test_a_reused_key_with_another_body_returns_422(self, api_client):
+        place_order(api_client, make_cart(api_client, self.product), 'order-1')
+
+        response = place_order(api_client, make_cart(api_client, self.product), 'order-1')
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert Order.objects.count() == 1
+
+    def test_failed_requests_are_not_stored(self, api_client):
+        cart_id = make_cart(api_client, self.product, quantity=11)
+
+        failed = place_order(api_client, cart_id, 'order-1')
+        Product.objects.filter(pk=self.product.id).update(quantity=11)
+        retry = place_order(api_client, cart_id, 'order-1')
+
+        assert failed.status_code == status.HTTP_400_BAD_REQUEST
+        assert retry.status_code == status.HTTP_200_OK
+        assert 'Idempotent-Replayed' not in retry
+        assert Order.objects.count() == 1
+
+    def test_keys_belong_to_a_user(self, api_client):
+        place_order(api_client, make_cart(api_client, self.product), 'order-1')
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        response = place_order(api_client, make_cart(api_client, self.product), 'order-1')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert Order.objects.count() == 2
+        assert IdempotencyKey.objects.filter(key='order-1').count() == 2
+
+    def test_long_keys_return_400(self, api_client):
+        response = place_order(api_client, make_cart(api_client, self.product), 'k' * 256)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Idempotency-Key' in response.data
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_duplicates_create_one_order():
+    if connection.vendor == 'sqlite':
+        # Without row locks, a transaction that reads before it writes can't
+        # wait for the write lock and fails with "database is locked"
+        pytest.skip('SQLite has no row locks to make concurrent writers wait')
+    workers = 6
+    product = baker.make(Product, quantity=10)
+    user = baker.make(settings.AUTH_USER_MODEL)
+    cart_id = make_cart(APIClient(), product)
+    barrier = threading.Barrier(workers)
+
+    def retry(_):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        try:
+            barrier.wait()
+            return place_order(client, cart_id, 'order-1')
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        responses = list(executor.map(retry, range(workers)))
+
+    assert [response.status_code for response in responses] == [status.HTTP_200_OK] * workers
+    assert len({response.content for response in responses}) == 1
+    assert sum('Idempotent-Replayed' in response for response in responses) == workers - 1
+    assert Order.objects.count() == 1
+    assert Product.objects.get(pk=product.id).quantity == 9
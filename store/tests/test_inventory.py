@@ -0,0 +1,105 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from rest_framework import status
+from rest_framework.test import APIClient
+from store.inventory import InsufficientStock, reserve_stock
+from store.models import Order, Product
+from model_bakery import baker
+import pytest
+
+
+@pytest.mark.django_db
+class TestReserveStock:
+    def test_takes_every_quantity_in_one_update(self, django_assert_num_queries):
+        products = baker.make(Product, quantity=5, _quantity=3)
+
+        with django_assert_num_queries(4) as captured:
+            reserve_stock({products[0].id: 5, products[2].id: 2})
+
+        # The row locks and the conditional UPDATE, within a savepoint
+        statements = [query['sql'] for query in captured.captured_queries
+                      if 'SAVEPOINT' not in query['sql']]
+        assert len(statements) == 2
+        assert statements[1].startswith('UPDATE')
+        assert [product.quantity for product in Product.objects.order_by('id')] == [0, 5, 3]
+
+    def test_locks_rows_in_primary_key_order(self, django_assert_num_queries):
+        products = baker.make(Product, quantity=5, _quantity=2)
+
+        with django_assert_num_queries(4) as captured:
+            reserve_stock({products[1].id: 1, products[0].id: 1})
+
+        assert re.search(r'ORDER BY (1|"store_product"."id") ASC', captured.captured_queries[1]['sql'])
+
+    def test_short_stock_takes_nothing(self):
+        plenty, scarce = baker.make(Product, quantity=5), baker.make(Product, quantity=1)
+
+        with pytest.raises(InsufficientStock) as error:
+            reserve_stock({plenty.id: 2, scarce.id: 3})
+
+        assert error.value.shortages == {scarce.id: (3, 1)}
+        assert Product.objects.get(pk=plenty.id).quantity == 5
+        assert Product.objects.get(pk=scarce.id).quantity == 1
+
+    def test_checkout_decrements_stock_or_reports_what_is_left(self, api_client):
+        product = baker.make(Product, quantity=3)
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        def checkout(quantity):
+            cart_id = api_client.post('/store/carts/').data['id']
+            api_client.post(f'/store/carts/{cart_id}/items/',
+                            {'product_id': product.id, 'quantity': quantity})
+            return api_client.post('/store/orders/', {'cart_id': cart_id})
+
+        assert checkout(2).status_code == status.HTTP_200_OK
+        response = checkout(2)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['cart_id'] == [f'Only 1 of product {product.id} left, 2 requested.']
+        assert Product.objects.get(pk=product.id).quantity == 1
+        assert Order.objects.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_checkouts_never_oversell_a_hot_product(capsys):
+    if connection.vendor == 'sqlite':
+        # Without row locks, a transaction that reads before it writes can't
+        # wait for the write lock and fails with "database is locked"
+        pytest.skip('SQLite has no row locks to make concurrent writers wait')
+    workers, stock = 8, 20
+    product = baker.make(Product, quantity=stock)
+    user = baker.make(settings.AUTH_USER_MODEL)
+    client = APIClient()
+    carts = []
+    for _ in range(stock + 10):
+        cart_id = client.post('/store/carts/').data['id']
+        client.post(f'/store/carts/{cart_id}/items/', {'product_id': product.id, 'quantity': 1})
+        carts.append(cart_id)
+    barrier = threading.Barrier(workers)
+
+    def checkout(cart_ids):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        try:
+            barrier.wait()
+            return [client.post('/store/orders/', {'cart_id': cart_id}).status_code
+                    for cart_id in cart_ids]
+        finally:
+            connection.close()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        statuses = sum(executor.map(checkout, [carts[i::workers] for i in range(workers)]), [])
+    elapsed = time.monotonic() - started
+
+    assert statuses.count(status.HTTP_200_OK) == stock
+    assert statuses.count(status.HTTP_400_BAD_REQUEST) == len(carts) - stock
+    assert Product.objects.get(pk=product.id).quantity == 0
+    assert Order.objects.count() == stock
+    with capsys.disabled():
+        print(f'\n{len(carts)} checkouts of one product on {workers} threads: '
+              f'{len(carts) / elapsed:.0f} checkouts/s')
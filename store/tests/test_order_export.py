@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from store.exports import export_orders
+from store.models import Order, OrderItem, Product
+from model_bakery import baker
+from rest_framework import status
+import json
+import pytest
+
+
+def make_order(placed_at, payment_status=Order.PAYMENT_PENDING, items=1, customer=None):
+    customer = customer or baker.make(settings.AUTH_USER_MODEL).customer
+    order = baker.make(Order, customer=customer, payment_status=payment_status)
+    Order.objects.filter(pk=order.pk).update(placed_at=placed_at)
+    for _ in range(items):
+        baker.make(OrderItem, order=order, product=baker.make(Product, title='Mug'),
+                   quantity=2, unit_price=Decimal('4.50'))
+    return order
+
+
+@pytest.mark.django_db
+class TestOrderExport:
+    endpoint = '/store/orders/export/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.october = make_order(datetime(2026, 10, 3, tzinfo=timezone.utc),
+                                  Order.PAYMENT_COMPLETE, items=2)
+        self.pending = make_order(datetime(2026, 10, 20, tzinfo=timezone.utc))
+        self.september = make_order(datetime(2026, 9, 30, 23, tzinfo=timezone.utc),
+                                    Order.PAYMENT_COMPLETE)
+
+    def test_returns_403_if_user_is_not_staff(self, api_client, authenticate_user):
+        authenticate_user(is_staff=False)
+
+        assert api_client.get(self.endpoint).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_streams_a_csv_line_per_item(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+
+        response = api_client.get(self.endpoint, {
+            'placed_after': '2026-10-01', 'placed_before': '2026-11-01', 'payment_status': 'C'})
+
+        assert response.streaming
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        items = self.october.items.order_by('id')
+        assert lines == [
+            'order_id,placed_at,payment_status,customer_id,'
+            'item_id,product_id,product_title,quantity,unit_price',
+        ] + [
+            f'{self.october.id},2026-10-03 00:00:00+00:00,C,{self.october.customer_id},'
+            f'{item.id},{item.product_id},Mug,2,4.50' for item in items
+        ]
+
+    def test_streams_ndjson(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+
+        response = api_client.get(self.endpoint, {
+            'file_format': 'ndjson', 'placed_after': '2026-10-04T00:00:00Z'})
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert [(row['order_id'], row['payment_status'], row['unit_price']) for row in rows] == [
+            (self.pending.id, 'P', '4.50')]
+
+    def test_invalid_filters_return_400(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+
+        response = api_client.get(self.endpoint, {
+            'placed_after': 'soon', 'payment_status': 'X', 'chunk_size': 0})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert set(response.data) == {'placed_after', 'payment_status', 'chunk_size'}
+
+
+@pytest.mark.django_db
+def test_export_walks_items_in_key_order_one_query_per_chunk(django_assert_num_queries):
+    customer = baker.make(settings.AUTH_USER_MODEL).customer
+    orders = [make_order(datetime(2026, 10, day, tzinfo=timezone.utc), items=3, customer=customer)
+              for day in (1, 2, 3)]
+    expected = list(OrderItem.objects.order_by('order_id', 'id').values_list('id', flat=True))
+
+    with django_assert_num_queries(5):
+        rows = list(export_orders(chunk_size=2))
+
+    assert [row['item_id'] for row in rows] == expected
+    assert [row['order_id'] for row in rows][::3] == [order.id for order in orders]
+
+
+@pytest.mark.django_db
+def test_command_writes_the_filtered_export(tmp_path):
+    make_order(datetime(2026, 9, 1, tzinfo=timezone.utc))
+    october = make_order(datetime(2026, 10, 1, tzinfo=timezone.utc), items=2)
+    path = tmp_path / 'orders.ndjson'
+
+    call_command('export_orders', format='ndjson', output=str(path),
+                 placed_after='2026-10-01', chunk_size=1)
+
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [row['order_id'] for row in rows] == [october.id, october.id]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('chunk_size', [0, -1])
+def test_command_rejects_chunk_sizes_below_one(chunk_size, tmp_path):
+    with pytest.raises(CommandError, match='chunk_size'):
+        call_command('export_orders', output=str(tmp_path / 'orders.csv'), chunk_size=chunk_size)
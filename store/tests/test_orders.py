@@ -0,0 +1,118 @@
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from store.customers import get_customer_id
+from store.models import Customer, Order, OrderItem, Product
+from model_bakery import baker
+import pytest
+
+
+def make_user(**kwargs):
+    return baker.make(settings.AUTH_USER_MODEL, **kwargs)
+
+
+@pytest.mark.django_db
+class TestOrderListing:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.user, other = make_user(), make_user()
+        self.orders = baker.make(Order, customer=self.user.customer, _quantity=3)
+        self.others = baker.make(Order, customer=other.customer, _quantity=2)
+        for order in self.orders + self.others:
+            baker.make(OrderItem, order=order, product=baker.make(Product), quantity=1)
+
+    def ids(self, response):
+        return sorted(order['id'] for order in response.data['results'])
+
+    def test_customers_only_see_their_orders(self, api_client):
+        api_client.force_authenticate(user=self.user)
+
+        response = api_client.get('/store/orders/')
+
+        assert self.ids(response) == sorted(order.id for order in self.orders)
+        other = api_client.get(f'/store/orders/{self.others[0].id}/')
+        assert other.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_staff_see_every_order(self, api_client):
+        api_client.force_authenticate(user=make_user(is_staff=True))
+
+        response = api_client.get('/store/orders/')
+
+        assert self.ids(response) == sorted(order.id for order in self.orders + self.others)
+
+    def test_customer_id_is_read_once(self, api_client, django_assert_num_queries):
+        api_client.force_authenticate(user=self.user)
+        api_client.get('/store/orders/')
+
+        # The page, its items and their products
+        with django_assert_num_queries(3):
+            api_client.get('/store/orders/')
+
+    def test_users_without_a_customer_see_no_orders(self, api_client):
+        user = make_user()
+        Customer.objects.filter(user=user).delete()
+        api_client.force_authenticate(user=user)
+
+        assert api_client.get('/store/orders/').data['results'] == []
+
+
+@pytest.mark.django_db
+class TestCustomerIdCache:
+    def test_moving_a_customer_forgets_both_users(self):
+        first, second = make_user(), make_user()
+        customer = first.customer
+        second.customer.delete()
+        assert get_customer_id(first.id) == customer.id
+        assert get_customer_id(second.id) is None
+
+        customer.user = second
+        customer.save()
+
+        assert get_customer_id(first.id) is None
+        assert get_customer_id(second.id) == customer.id
+
+    def test_deleted_customers_are_forgotten(self):
+        user = make_user()
+        get_customer_id(user.id)
+
+        user.customer.delete()
+
+        assert get_customer_id(user.id) is None
+
+
+@pytest.mark.django_db
+class TestOrderPagination:
+    def test_walks_newest_first_with_id_tiebreaker(self, api_client):
+        user = make_user()
+        orders = baker.make(Order, customer=user.customer, _quantity=25)
+        now = timezone.now()
+        # Pairs of orders share a timestamp
+        for index, order in enumerate(orders):
+            Order.objects.filter(pk=order.pk).update(placed_at=now - timedelta(minutes=index // 2))
+        api_client.force_authenticate(user=user)
+
+        ids, url = [], '/store/orders/'
+        while url:
+            response = api_client.get(url)
+            assert 'count' not in response.data
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+
+        expected = sorted(Order.objects.all(), key=lambda order: (order.placed_at, order.id),
+                          reverse=True)
+        assert ids == [order.id for order in expected]
+
+    def test_pages_seek_instead_of_offset(self, api_client, django_assert_num_queries):
+        user = make_user()
+        baker.make(Order, customer=user.customer, _quantity=15)
+        api_client.force_authenticate(user=user)
+        url = api_client.get('/store/orders/', {'fields': 'id'}).data['next']
+
+        with django_assert_num_queries(1) as captured:
+            response = api_client.get(url)
+
+        sql = captured.captured_queries[0]['sql']
+        assert len(response.data['results']) == 5
+        assert 'OFFSET' not in sql
+        assert '"store_order"."placed_at" <' in sql
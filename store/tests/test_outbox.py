@@ -0,0 +1,148 @@
+from datetime import timedelta
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from store import outbox
+from store.models import Order, OutboxEvent, Product
+from store.serializers import OrderCreationSerializer
+from store.signals import order_created
+from model_bakery import baker
+import pytest
+
+
+@pytest.fixture
+def received():
+    orders = []
+
+    def receiver(sender, order, **kwargs):
+        orders.append(order.id)
+    order_created.connect(receiver, weak=False)
+    yield orders
+    order_created.disconnect(receiver)
+
+
+def dispatch_outbox(**options):
+    out = StringIO()
+    call_command('dispatch_outbox', once=True, stdout=out, **options)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+class TestCheckoutEvents:
+    def checkout(self, api_client, quantity=1):
+        product = baker.make(Product, quantity=1)
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+        cart_id = api_client.post('/store/carts/').data['id']
+        api_client.post(f'/store/carts/{cart_id}/items/',
+                        {'product_id': product.id, 'quantity': quantity})
+        return api_client.post('/store/orders/', {'cart_id': cart_id})
+
+    def test_checkout_records_the_event_without_running_receivers(self, api_client, received):
+        response = self.checkout(api_client)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert received == []
+        event = OutboxEvent.objects.get(topic='order_created')
+        assert event.payload == {'order_id': response.data['id']}
+
+    def test_failed_checkout_records_nothing(self, api_client):
+        response = self.checkout(api_client, quantity=2)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not OutboxEvent.objects.exists()
+
+    def test_worker_runs_the_receivers(self, api_client, received):
+        order_id = self.checkout(api_client).data['id']
+
+        output = dispatch_outbox(workers=1)
+
+        assert received == [order_id]
+        assert OutboxEvent.objects.get(topic='order_created').dispatched_at is not None
+        # The order's sales rollup event too
+        assert '2 events dispatched, 0 failed.' in output
+
+
+@pytest.mark.django_db
+class TestDispatch:
+    def test_failures_are_retried_with_backoff(self, received):
+        order = baker.make(Order, customer=baker.make(settings.AUTH_USER_MODEL).customer)
+        calls = []
+
+        def flaky(sender, order, **kwargs):
+            calls.append(order.id)
+            if len(calls) == 1:
+                raise RuntimeError('ERP is down')
+        order_created.connect(flaky, weak=False)
+        try:
+            outbox.publish('order_created', order_id=order.id)
+            assert outbox.dispatch_events(outbox.claim_events()) == (0, 1)
+
+            event = OutboxEvent.objects.get()
+            assert event.attempts == 1
+            assert 'ERP is down' in event.last_error
+            assert event.available_at > timezone.now() + timedelta(seconds=1)
+            # Every receiver ran despite the failure, and nothing is due yet
+            assert received == [order.id]
+            assert outbox.claim_events() == []
+
+            OutboxEvent.objects.update(available_at=timezone.now())
+            assert outbox.dispatch_events(outbox.claim_events()) == (1, 0)
+        finally:
+            order_created.disconnect(flaky)
+
+        event = OutboxEvent.objects.get()
+        assert (event.attempts, event.last_error) == (2, '')
+        assert event.dispatched_at is not None
+
+    def test_claimed_events_are_leased(self):
+        outbox.publish('order_created', order_id=0)
+
+        assert len(outbox.claim_events(lease=60)) == 1
+        assert outbox.claim_events() == []
+
+    def test_claims_batches_in_order_and_gives_up_after_max_attempts(self):
+        first, second, third = [outbox.publish('unknown', n=n) for n in range(3)]
+        OutboxEvent.objects.filter(pk=third.pk).update(attempts=3)
+
+        assert outbox.claim_events(batch_size=1, max_attempts=3) == [first]
+        assert outbox.claim_events(batch_size=5, max_attempts=3) == [second]
+
+    def test_receivers_of_the_checkout_serializer_still_fire(self):
+        order = baker.make(Order, customer=baker.make(settings.AUTH_USER_MODEL).customer)
+        senders = []
+
+        def receiver(sender, order, **kwargs):
+            senders.append(sender)
+        order_created.connect(receiver, sender=OrderCreationSerializer, weak=False)
+        try:
+            outbox.publish('order_created', order_id=order.id)
+            assert outbox.dispatch_events(outbox.claim_events()) == (1, 0)
+        finally:
+            order_created.disconnect(receiver, sender=OrderCreationSerializer)
+
+        assert senders == [OrderCreationSerializer]
+
+    def test_unknown_topics_fail(self):
+        outbox.publish('unknown')
+
+        assert outbox.dispatch_events(outbox.claim_events()) == (0, 1)
+        assert "No handler for 'unknown' events." in OutboxEvent.objects.get().last_error
+
+    def test_backoff_grows_to_an_hour(self):
+        assert [outbox.get_backoff(attempts) for attempts in (1, 2, 5, 20)] == [2, 4, 32, 3600]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_worker_dispatches_through_a_thread_pool(received):
+    customer = baker.make(settings.AUTH_USER_MODEL).customer
+    orders = baker.make(Order, customer=customer, _quantity=6)
+    for order in orders:
+        outbox.publish('order_created', order_id=order.id)
+
+    output = dispatch_outbox(workers=3, batch_size=4)
+
+    assert sorted(received) == sorted(order.id for order in orders)
+    assert not OutboxEvent.objects.filter(dispatched_at__isnull=True).exists()
+    assert '6 events dispatched, 0 failed.' in output
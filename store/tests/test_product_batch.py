@@ -0,0 +1,119 @@
+from decimal import Decimal
+from django.conf import settings
+from store.models import Product, Collection, Promotion, Order, OrderItem
+from store import cache
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductBatch:
+    endpoint = '/store/products/batch/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.collection = baker.make(Collection)
+        self.promotion = baker.make(Promotion)
+        self.products = baker.make(Product, collection=self.collection,
+                                   unit_price=Decimal(5), quantity=1, _quantity=3)
+
+    def row(self, **data):
+        return {'title': 'Product', 'unit_price': '12.00', 'quantity': 4,
+                'collection': self.collection.id, **data}
+
+    def test_returns_403_if_user_is_not_staff(self, api_client, authenticate_user):
+        authenticate_user(is_staff=False)
+
+        response = api_client.post(self.endpoint, {'create': [self.row()]}, format='json')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_applies_creates_updates_and_deletes(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        payload = {
+            'create': [self.row(title='New', promotion=[self.promotion.id])],
+            'update': [self.row(id=self.products[0].id, title='Updated')],
+            'delete': [self.products[1].id],
+        }
+
+        response = api_client.post(self.endpoint, payload, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        created = Product.objects.get(pk=response.data['created'][0])
+        assert list(created.promotion.all()) == [self.promotion]
+        assert Product.objects.get(pk=self.products[0].id).title == 'Updated'
+        assert not Product.objects.filter(pk=self.products[1].id).exists()
+
+    def test_updates_leave_omitted_fields_alone(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        product = self.products[0]
+        Product.objects.filter(pk=product.id).update(description='Kept', slug='kept')
+        product.promotion.add(self.promotion)
+
+        response = api_client.post(
+            self.endpoint, {'update': [self.row(id=product.id, title='Updated')]}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        product.refresh_from_db()
+        assert (product.title, product.description, product.slug) == ('Updated', 'Kept', 'kept')
+        assert list(product.promotion.all()) == [self.promotion]
+
+    def test_rejects_the_whole_batch_on_any_invalid_row(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        payload = {
+            'create': [self.row(title='Valid'), self.row(unit_price='0')],
+            'delete': [0],
+        }
+
+        response = api_client.post(self.endpoint, payload, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'create' in response.data
+        assert not Product.objects.filter(title='Valid').exists()
+
+    def test_rejects_batches_over_the_row_limit(self, api_client, authenticate_user, settings):
+        authenticate_user(is_staff=True)
+        settings.STORE_PRODUCT_BATCH_MAX_ROWS = 2
+        payload = {'create': [self.row(title='Over')] * 2, 'delete': [self.products[0].id]}
+
+        response = api_client.post(self.endpoint, payload, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['non_field_errors'] == ['A batch may have at most 2 rows, got 3.']
+        assert not Product.objects.filter(title='Over').exists()
+
+    def test_rejects_creates_with_an_id(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        payload = {'create': [self.row(id=self.products[0].id, title='Clash')]}
+
+        response = api_client.post(self.endpoint, payload, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['create'] == ['Creates must not have an id, use update.']
+        assert Product.objects.get(pk=self.products[0].id).title != 'Clash'
+
+    def test_rejects_deleting_ordered_products(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        customer = baker.make(settings.AUTH_USER_MODEL).customer
+        baker.make(OrderItem, product=self.products[2], quantity=1, unit_price=Decimal(1),
+                   order=baker.make(Order, customer=customer))
+
+        response = api_client.post(
+            self.endpoint, {'delete': [self.products[2].id]}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_invalidates_cache_once_per_batch(self, api_client, authenticate_user, monkeypatch):
+        authenticate_user(is_staff=True)
+        bumps = []
+        bump = cache._bump
+        monkeypatch.setattr(cache, '_bump', lambda namespaces: bumps.append(namespaces) or bump(namespaces))
+        payload = {
+            'update': [self.row(id=product.id) for product in self.products[:2]],
+            'delete': [self.products[2].id],
+        }
+
+        api_client.post(self.endpoint, payload, format='json')
+
+        assert len(bumps) == 1
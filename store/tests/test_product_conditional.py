@@ -0,0 +1,148 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from django.utils import timezone
+from rest_framework import status
+from store.models import Collection, Product, Promotion
+from model_bakery import baker
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductDetailValidators:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.product = baker.make(Product, collection=baker.make(Collection))
+        self.url = f'/store/products/{self.product.id}/'
+
+    def test_sends_strong_etag_and_last_modified(self, api_client):
+        response = api_client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'].startswith('"')
+        assert 'Last-Modified' in response
+
+    def test_if_none_match_returns_304_without_serializing(self, api_client, django_assert_max_num_queries):
+        etag = api_client.get(self.url)['ETag']
+
+        with django_assert_max_num_queries(1):
+            response = api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+        assert not response.content
+
+    def test_if_modified_since_returns_304(self, api_client):
+        last_modified = api_client.get(self.url)['Last-Modified']
+
+        response = api_client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_etag_changes_with_the_product(self, api_client):
+        etag = api_client.get(self.url)['ETag']
+        Product.objects.filter(pk=self.product.pk).update(quantity=7)
+
+        response = api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+    def test_etag_changes_with_the_promotions(self, api_client):
+        etag = api_client.get(self.url)['ETag']
+        self.product.promotion.add(baker.make(Promotion))
+
+        response = api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_collection_rename_moves_last_modified(self, api_client):
+        before = Product.objects.get(pk=self.product.pk).last_update
+        self.product.collection.name = 'Renamed'
+        self.product.collection.save()
+
+        assert Product.objects.get(pk=self.product.pk).last_update > before
+
+    def test_other_collection_changes_keep_last_modified(self, api_client):
+        before = Product.objects.get(pk=self.product.pk).last_update
+        self.product.collection.featured_product = self.product
+        self.product.collection.save()
+
+        assert Product.objects.get(pk=self.product.pk).last_update == before
+
+    def test_promotion_delete_moves_last_modified(self, api_client):
+        # Its promotion ids change even if the price doesn't
+        promotion = baker.make(Promotion, discount=0)
+        self.product.promotion.add(promotion)
+        # Last-Modified has a resolution of a second
+        Product.objects.filter(pk=self.product.pk).update(
+            last_update=timezone.now() - timedelta(minutes=1))
+        last_modified = api_client.get(self.url)['Last-Modified']
+
+        promotion.delete()
+        response = api_client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_etag_depends_on_the_selected_fields(self, api_client):
+        etag = api_client.get(self.url)['ETag']
+
+        response = api_client.get(self.url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_missing_product_returns_404(self, api_client):
+        response = api_client.get('/store/products/0/', HTTP_IF_NONE_MATCH='"x"')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestProductListValidators:
+    def test_if_none_match_returns_304(self, api_client):
+        baker.make(Product, _quantity=3)
+        etag = api_client.get('/store/products/', {'facets': 1})['ETag']
+
+        response = api_client.get('/store/products/', {'facets': 1}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert 'Last-Modified' not in response
+
+    def test_uncached_validators_do_not_query(
+            self, api_client, monkeypatch, django_assert_num_queries):
+        baker.make(Product, _quantity=3)
+        etag = api_client.get('/store/products/')['ETag']
+        monkeypatch.setattr('store.conditional.cache', SimpleNamespace(
+            get_or_set=lambda key, default, timeout: default()))
+
+        # Built from the namespace versions, not an aggregate over the rows
+        with django_assert_num_queries(0):
+            response = api_client.get('/store/products/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_etag_changes_when_a_product_is_deleted(self, api_client):
+        products = baker.make(Product, _quantity=3)
+        etag = api_client.get('/store/products/')['ETag']
+        products[0].delete()
+
+        response = api_client.get('/store/products/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_etag_follows_the_filters(self, api_client):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection)
+        etag = api_client.get('/store/products/')['ETag']
+
+        response = api_client.get(
+            '/store/products/', {'collection_id': collection.id}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_search_listing_has_an_etag(self, api_client):
+        baker.make(Product, title='Green tea')
+
+        response = api_client.get('/store/products/', {'search': 'tea'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag']
@@ -0,0 +1,77 @@
+from decimal import Decimal
+from store.models import Product, Collection
+from model_bakery import baker
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductFacets:
+    endpoint = '/store/products/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.shoes = baker.make(Collection, name='Shoes')
+        self.hats = baker.make(Collection, name='Hats')
+        for collection, price, quantity in [
+            (self.shoes, '5', 3), (self.shoes, '45', 20), (self.shoes, '600', 80),
+            (self.hats, '12', 10), (self.hats, '99.99', 60),
+        ]:
+            baker.make(Product, collection=collection, title='Thing',
+                       unit_price=Decimal(price), quantity=quantity)
+
+    def get_facets(self, api_client, **params):
+        response = api_client.get(self.endpoint, {'facets': 'true', **params})
+        return response.data['facets']
+
+    def test_counts_every_facet_in_one_query(self, api_client, django_assert_num_queries):
+        # count, page, promotions and facets
+        with django_assert_num_queries(4):
+            facets = self.get_facets(api_client)
+
+        assert facets['collection'] == [
+            {'id': self.shoes.id, 'name': 'Shoes', 'count': 3},
+            {'id': self.hats.id, 'name': 'Hats', 'count': 2},
+        ]
+        assert [bucket['count'] for bucket in facets['price']] == [1, 2, 1, 0, 1]
+        assert facets['inventory'] == [
+            {'band': 'Low', 'count': 1},
+            {'band': 'Mid', 'count': 1},
+            {'band': 'Good', 'count': 2},
+        ]
+
+    def test_facets_follow_the_filters(self, api_client):
+        facets = self.get_facets(api_client, collection_id=self.hats.id)
+
+        assert facets['collection'] == [
+            {'id': self.hats.id, 'name': 'Hats', 'count': 2}]
+
+    def test_facets_are_cached_across_pages(self, api_client, django_assert_num_queries):
+        self.get_facets(api_client, unit_price__lt=100)
+
+        # page, count and promotions, the facets come from the cache
+        with django_assert_num_queries(3):
+            self.get_facets(api_client, unit_price__lt=100, ordering='-id')
+
+    def test_facets_are_cached_across_field_selections(self, api_client, django_assert_num_queries):
+        facets = self.get_facets(api_client)
+
+        # count and page, the facets come from the cache
+        with django_assert_num_queries(2):
+            assert self.get_facets(api_client, fields='id,title', omit='title') == facets
+
+    def test_facets_are_invalidated_by_writes(self, api_client):
+        self.get_facets(api_client)
+        baker.make(Product, collection=self.hats, unit_price=Decimal(1), quantity=1)
+
+        assert self.get_facets(api_client)['inventory'][0]['count'] == 2
+
+    def test_facets_are_only_returned_on_request(self, api_client):
+        assert 'facets' not in api_client.get(self.endpoint).data
+
+    def test_facets_work_with_search(self, api_client):
+        baker.make(Product, collection=self.hats, title='Wool beanie', quantity=5)
+
+        facets = self.get_facets(api_client, search='beanie')
+
+        assert facets['collection'] == [
+            {'id': self.hats.id, 'name': 'Hats', 'count': 1}]
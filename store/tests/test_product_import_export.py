@@ -0,0 +1,127 @@
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from store.models import Product, Collection, Promotion
+from model_bakery import baker
+from rest_framework import status
+import json
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductExport:
+    endpoint = '/store/products/export/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.collection = baker.make(Collection)
+        self.promotions = baker.make(Promotion, _quantity=2)
+        self.product = baker.make(Product, title='Mug', slug='mug', description=None,
+                                  unit_price=Decimal('9.50'), quantity=3,
+                                  collection=self.collection)
+        self.product.promotion.set(self.promotions)
+
+    def test_returns_403_if_user_is_not_staff(self, api_client, authenticate_user):
+        authenticate_user(is_staff=False)
+
+        assert api_client.get(self.endpoint).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_streams_csv(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+
+        response = api_client.get(self.endpoint)
+
+        assert response.streaming
+        assert b''.join(response.streaming_content).decode().splitlines() == [
+            'id,title,slug,description,unit_price,quantity,collection,promotion',
+            f'{self.product.id},Mug,mug,,9.50,3,{self.collection.id},'
+            f'{self.promotions[0].id}|{self.promotions[1].id}',
+        ]
+
+    def test_streams_ndjson(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+
+        response = api_client.get(self.endpoint, {'file_format': 'ndjson'})
+
+        row = json.loads(b''.join(response.streaming_content))
+        assert row['unit_price'] == '9.50'
+        assert row['promotion'] == [promotion.id for promotion in self.promotions]
+
+
+@pytest.mark.django_db
+class TestProductImport:
+    endpoint = '/store/products/import/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        self.collection = baker.make(Collection)
+        self.promotion = baker.make(Promotion)
+        self.existing = baker.make(Product, collection=self.collection, quantity=1)
+
+    def upload(self, api_client, name, content):
+        return api_client.post(self.endpoint, {
+            'file': SimpleUploadedFile(name, content.encode())
+        }, format='multipart')
+
+    def test_creates_and_updates_products_from_csv(self, api_client):
+        content = (
+            'id,title,slug,description,unit_price,quantity,collection,promotion\n'
+            f',New,,,5.00,7,{self.collection.id},{self.promotion.id}\n'
+            f'{self.existing.id},Renamed,renamed,Text,6.00,2,{self.collection.id},\n'
+        )
+
+        response = self.upload(api_client, 'products.csv', content)
+
+        assert response.data == {'created': 1, 'updated': 1, 'errors': []}
+        created = Product.objects.get(title='New')
+        assert created.slug == 'new'
+        assert list(created.promotion.all()) == [self.promotion]
+        self.existing.refresh_from_db()
+        assert (self.existing.title, self.existing.quantity) == ('Renamed', 2)
+
+    def test_reports_invalid_rows_without_aborting(self, api_client):
+        rows = [
+            {'title': 'Good', 'unit_price': '5', 'quantity': 1, 'collection': self.collection.id},
+            {'title': 'Cheap', 'unit_price': '0.5', 'quantity': 1, 'collection': self.collection.id},
+            {'title': 'Orphan', 'unit_price': '5', 'quantity': 1, 'collection': 0},
+        ]
+        content = '\n'.join(map(json.dumps, rows)) + '\nnot json\n'
+
+        response = self.upload(api_client, 'products.ndjson', content)
+
+        assert response.data['created'] == 1
+        assert [error['row'] for error in response.data['errors']] == [2, 3, 4]
+        assert Product.objects.filter(title='Good').exists()
+
+    def test_isolates_rows_that_fail_in_the_database(self, api_client):
+        row = {'id': 999, 'title': 'Twice', 'unit_price': '5', 'quantity': 1,
+               'collection': self.collection.id}
+        content = f'{json.dumps(row)}\n{json.dumps(row)}\n'
+
+        response = self.upload(api_client, 'products.ndjson', content)
+
+        assert response.data['created'] == 1
+        assert [error['row'] for error in response.data['errors']] == [2]
+
+    def test_import_invalidates_product_cache(self, api_client):
+        api_client.get('/store/products/')
+        content = f'{{"title": "New", "unit_price": "5", "quantity": 1, "collection": {self.collection.id}}}\n'
+
+        self.upload(api_client, 'products.ndjson', content)
+
+        assert api_client.get('/store/products/').data['count'] == 2
+
+
+@pytest.mark.django_db
+def test_commands_round_trip_products(tmp_path):
+    collection = baker.make(Collection)
+    baker.make(Product, collection=collection, unit_price=Decimal('3.25'), quantity=1,
+               _quantity=3)
+    path = tmp_path / 'products.ndjson'
+
+    call_command('export_products', format='ndjson', output=str(path), chunk_size=2)
+    Product.objects.all().delete()
+    call_command('import_products', str(path))
+
+    assert Product.objects.filter(unit_price=Decimal('3.25')).count() == 3
@@ -0,0 +1,70 @@
+from rest_framework import status
+from store.models import Collection, Product, Promotion
+from model_bakery import baker
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductMultiGet:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        collection = baker.make(Collection)
+        self.products = baker.make(Product, collection=collection, _quantity=3)
+        self.products[1].promotion.set(baker.make(Promotion, _quantity=2))
+
+    def get(self, api_client, ids, **params):
+        return api_client.get('/store/products/', {'ids': ','.join(map(str, ids)), **params})
+
+    @pytest.mark.parametrize('values_serializer', [True, False])
+    def test_returns_products_in_requested_order(self, api_client, settings, values_serializer):
+        settings.STORE_PRODUCT_VALUES_SERIALIZER = values_serializer
+        ids = [self.products[2].id, self.products[0].id, self.products[1].id]
+
+        response = self.get(api_client, ids)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [product['id'] for product in response.data] == ids
+        for product in response.data:
+            assert product == api_client.get(f'/store/products/{product["id"]}/').data
+
+    def test_skips_unknown_and_duplicate_ids(self, api_client):
+        response = self.get(api_client, [self.products[0].id, 0, self.products[0].id])
+
+        assert [product['id'] for product in response.data] == [self.products[0].id]
+
+    def test_only_misses_reach_the_database(self, api_client, django_assert_num_queries):
+        self.get(api_client, [self.products[0].id])
+
+        # products and promotions of the two misses
+        with django_assert_num_queries(2):
+            response = self.get(api_client, [product.id for product in self.products])
+
+        assert len(response.data) == 3
+
+        with django_assert_num_queries(0):
+            self.get(api_client, [product.id for product in self.products])
+
+    def test_writes_invalidate_the_product(self, api_client):
+        product = self.products[0]
+        self.get(api_client, [product.id])
+        Product.objects.filter(pk=product.pk).update(title='Renamed')
+
+        response = self.get(api_client, [product.id])
+
+        assert response.data[0]['title'] == 'Renamed'
+
+    def test_respects_sparse_fieldsets(self, api_client):
+        response = self.get(api_client, [self.products[0].id], fields='id,title')
+
+        assert list(response.data[0]) == ['id', 'title']
+
+    @pytest.mark.parametrize('ids', ['1,abc', '1,99999999999999999999999', '1,-9223372036854775809'])
+    def test_invalid_ids_return_400(self, api_client, ids):
+        response = api_client.get('/store/products/', {'ids': ids})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_too_many_ids_return_400(self, api_client):
+        response = self.get(api_client, range(1, 102))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
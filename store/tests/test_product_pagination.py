@@ -0,0 +1,65 @@
+from decimal import Decimal
+from store.models import Product, Collection
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductCursorPagination:
+    endpoint = '/store/products/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.collection = baker.make(Collection)
+        other = baker.make(Collection)
+        prices = [5, 3, 5, 8, 3, 5, 1, 8, 5, 2, 3, 5]
+        self.products = [
+            baker.make(Product, collection=self.collection,
+                       unit_price=Decimal(price), quantity=index)
+            for index, price in enumerate(prices)
+        ]
+        baker.make(Product, collection=other, unit_price=Decimal(4))
+
+    def walk(self, api_client, url):
+        ids = []
+        while url:
+            response = api_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert 'count' not in response.data
+            ids += [product['id'] for product in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_first_page_has_no_previous_link(self, api_client):
+        response = api_client.get(f'{self.endpoint}?cursor=')
+
+        assert response.data['previous'] is None
+        assert len(response.data['results']) == 10
+        assert response.data['next'] is not None
+
+    def test_walks_every_product_once_with_id_tiebreaker(self, api_client):
+        ids = self.walk(
+            api_client,
+            f'{self.endpoint}?cursor=&ordering=-unit_price&collection_id={self.collection.id}')
+
+        expected = sorted(self.products, key=lambda p: (-p.unit_price, -p.id))
+        assert ids == [product.id for product in expected]
+
+    def test_previous_link_returns_preceding_page(self, api_client):
+        first = api_client.get(f'{self.endpoint}?cursor=&ordering=unit_price')
+        second = api_client.get(first.data['next'])
+        back = api_client.get(second.data['previous'])
+
+        assert back.data['results'] == first.data['results']
+        assert back.data['previous'] is None
+
+    def test_invalid_cursor_returns_404(self, api_client):
+        response = api_client.get(f'{self.endpoint}?cursor=garbage')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_page_number_pagination_remains_default(self, api_client):
+        response = api_client.get(self.endpoint)
+
+        assert response.data['count'] == len(self.products) + 1
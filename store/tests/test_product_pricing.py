@@ -0,0 +1,96 @@
+from decimal import Decimal
+from store.models import Collection, Product, Promotion
+from store.pricing import get_effective_price
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+
+def effective_price(product):
+    return Product.objects.get(pk=product.pk).effective_price
+
+
+def test_effective_price_applies_the_discount_and_tax():
+    assert get_effective_price(Decimal('10.00')) == Decimal('15.00')
+    assert get_effective_price(Decimal('10.00'), 0.2) == Decimal('12.00')
+    assert get_effective_price(Decimal('9.99'), 0.333) == Decimal('9.99')
+    assert get_effective_price(Decimal('10.00'), 1.5) == Decimal('0.00')
+
+
+@pytest.mark.django_db
+class TestEffectivePrice:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.product = baker.make(Product, unit_price=Decimal('10.00'), quantity=1)
+        self.promotion = baker.make(Promotion, discount=0.2)
+
+    def test_is_set_on_save(self):
+        assert effective_price(self.product) == Decimal('15.00')
+
+        self.product.unit_price = Decimal('20.00')
+        self.product.save()
+
+        assert effective_price(self.product) == Decimal('30.00')
+
+    def test_follows_the_best_linked_promotion(self):
+        self.product.promotion.add(self.promotion, baker.make(Promotion, discount=0.1))
+        assert effective_price(self.product) == Decimal('12.00')
+
+        self.product.promotion.remove(self.promotion)
+        assert effective_price(self.product) == Decimal('13.50')
+
+        self.product.promotion.clear()
+        assert effective_price(self.product) == Decimal('15.00')
+
+    def test_follows_reverse_link_changes(self):
+        self.promotion.product_set.add(self.product)
+        assert effective_price(self.product) == Decimal('12.00')
+
+        self.promotion.product_set.clear()
+        assert effective_price(self.product) == Decimal('15.00')
+
+    def test_follows_promotion_changes(self):
+        self.product.promotion.add(self.promotion)
+
+        self.promotion.discount = 0.5
+        self.promotion.save()
+        assert effective_price(self.product) == Decimal('7.50')
+
+        self.promotion.delete()
+        assert effective_price(self.product) == Decimal('15.00')
+
+    def test_follows_queryset_updates(self):
+        Product.objects.filter(unit_price__lt=11).update(unit_price=Decimal('4.00'))
+
+        assert effective_price(self.product) == Decimal('6.00')
+
+    def test_follows_batch_writes(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+        row = {'title': 'Product', 'unit_price': '2.00', 'quantity': 4,
+               'collection': self.product.collection_id}
+
+        response = api_client.post('/store/products/batch/', {
+            'create': [{**row, 'promotion': [self.promotion.id]}],
+            'update': [{**row, 'id': self.product.id}],
+        }, format='json')
+
+        created = Product.objects.get(pk=response.data['created'][0])
+        assert created.effective_price == Decimal('2.40')
+        assert effective_price(self.product) == Decimal('3.00')
+
+
+@pytest.mark.django_db
+class TestEffectivePriceApi:
+    def test_filter_and_order_by_effective_price(self, api_client):
+        collection = baker.make(Collection)
+        cheap, discounted, expensive = [
+            baker.make(Product, collection=collection, unit_price=Decimal(price), quantity=1)
+            for price in ('5.00', '40.00', '30.00')]
+        discounted.promotion.add(baker.make(Promotion, discount=0.5))
+
+        response = api_client.get('/store/products/', {
+            'effective_price__gt': 10, 'ordering': 'effective_price'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [(p['id'], p['effective_price']) for p in response.json()['results']] == [
+            (discounted.id, 30.0), (expensive.id, 45.0)]
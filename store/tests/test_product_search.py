@@ -0,0 +1,55 @@
+from store.models import Product, Collection
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductSearch:
+    endpoint = '/store/products/'
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.collection = baker.make(Collection)
+        self.coffee = self.make('Coffee mug', 'A blue mug for coffee. Coffee!')
+        self.tea = self.make('Tea cup', 'Porcelain cup, great with coffee too')
+        self.plate = self.make('Blue plate', None)
+
+    def make(self, title, description):
+        return baker.make(Product, title=title, description=description,
+                          collection=self.collection)
+
+    def search(self, api_client, query, **params):
+        response = api_client.get(self.endpoint, {'search': query, **params})
+        assert response.status_code == status.HTTP_200_OK
+        return [product['id'] for product in response.data['results']]
+
+    def test_matches_title_and_description_by_relevance(self, api_client):
+        assert self.search(api_client, 'coffee') == [self.coffee.id, self.tea.id]
+
+    def test_requires_every_term(self, api_client):
+        assert self.search(api_client, 'blue mug') == [self.coffee.id]
+
+    def test_matches_last_term_as_prefix(self, api_client):
+        assert self.search(api_client, 'porcel') == [self.tea.id]
+
+    def test_explicit_ordering_wins_over_relevance(self, api_client):
+        ids = self.search(api_client, 'coffee', ordering='-id')
+
+        assert ids == [self.tea.id, self.coffee.id]
+
+    def test_index_follows_updates_and_deletes(self, api_client):
+        self.plate.title = 'Green plate'
+        self.plate.save()
+        self.coffee.delete()
+
+        assert self.search(api_client, 'blue') == []
+        assert self.search(api_client, 'green') == [self.plate.id]
+
+    def test_syntax_characters_are_ignored(self, api_client):
+        assert self.search(api_client, '"tea" (cup*') == [self.tea.id]
+
+    def test_admin_search_uses_the_index(self, admin_client):
+        response = admin_client.get('/admin/store/product/', {'q': 'porcelain'})
+
+        assert list(response.context['cl'].queryset) == [self.tea]
@@ -0,0 +1,55 @@
+from decimal import Decimal
+from django.core.management import call_command
+from rest_framework.renderers import JSONRenderer
+from store.models import Product, Collection, Promotion
+from store.serializers import ProductReadSerializer, ProductValuesSerializer
+from model_bakery import baker
+import pytest
+
+
+@pytest.mark.django_db
+class TestProductValuesSerializer:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        collection = baker.make(Collection)
+        promotions = baker.make(Promotion, _quantity=3)
+        self.products = [
+            baker.make(Product, collection=collection, unit_price=Decimal('12.35')),
+            baker.make(Product, collection=collection, unit_price=Decimal('7.00'),
+                       description=None),
+            baker.make(Product, collection=collection, unit_price=Decimal('1.99')),
+        ]
+        self.products[0].promotion.set([promotions[2], promotions[0]])
+        self.products[2].promotion.set([promotions[1]])
+
+    def queryset(self):
+        return Product.objects.select_related(
+            'collection').prefetch_related('promotion').order_by('id')
+
+    def test_renders_the_same_json_as_the_model_serializer(self):
+        renderer = JSONRenderer()
+        expected = renderer.render(
+            ProductReadSerializer(self.queryset(), many=True).data)
+
+        rows = ProductValuesSerializer.get_queryset(self.queryset())
+        actual = renderer.render(ProductValuesSerializer(rows, many=True).data)
+
+        assert actual == expected
+
+    def test_list_runs_one_query_for_promotions(self, api_client, django_assert_num_queries):
+        # count, page and promotions
+        with django_assert_num_queries(3):
+            api_client.get('/store/products/')
+
+    def test_retrieve_matches_the_model_serializer(self, api_client):
+        product = self.queryset().get(pk=self.products[0].id)
+
+        response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.content == JSONRenderer().render(
+            ProductReadSerializer(product).data)
+
+    def test_benchmark_command_reports_speedup(self, capsys):
+        call_command('benchmark_product_serializers', repeat=1)
+
+        assert 'output is identical' in capsys.readouterr().out
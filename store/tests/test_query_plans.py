@@ -0,0 +1,93 @@
+import re
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from store.models import Cart, Collection, Order, Product, Review
+from model_bakery import baker
+import pytest
+
+
+def explain(sql, params=()):
+    """Return the plan of a query as (table, full scan, sorts without index) rows."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+            rows = []
+            for detail in details:
+                match = re.match(r'(SCAN|SEARCH) (\w+)( USING (COVERING )?INDEX)?', detail)
+                if match:
+                    rows.append((match[2], match[1] == 'SCAN' and not match[3], False))
+                elif detail.startswith('USE TEMP B-TREE FOR ORDER BY'):
+                    rows.append((None, False, True))
+            return rows
+        if connection.vendor == 'mysql':
+            cursor.execute(f'EXPLAIN FORMAT=JSON {sql}', params)
+            plan = cursor.fetchone()[0]
+            tables = re.findall(r'"table_name": "(\w+)",\s*"access_type": "(\w+)"', plan)
+            sorts = '"using_filesort": true' in plan
+            return [(table, access == 'ALL', False) for table, access in tables] + \
+                [(None, False, sorts)]
+    pytest.skip(f'No plan parser for {connection.vendor}')
+
+
+def assert_indexed(queries, table):
+    """Fail if any captured query fully scans `table` or sorts it without an index."""
+    checked = [query['sql'] for query in queries if table in query['sql']]
+    assert checked, f'No query touched {table}'
+    for sql in checked:
+        for scanned, full_scan, sort in explain(sql):
+            assert not (full_scan and scanned == table), f'Full scan of {table}: {sql}'
+            assert not sort, f'Sort without an index: {sql}'
+
+
+@pytest.fixture
+def capture():
+    return CaptureQueriesContext(connection)
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+    def test_products_by_collection_and_price(self, api_client, capture):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, quantity=1, _quantity=3)
+
+        with capture:
+            api_client.get('/store/products/', {
+                'collection_id': collection.id,
+                'unit_price__gt': 1, 'unit_price__lt': 100,
+                'ordering': 'unit_price'})
+
+        assert_indexed(capture.captured_queries, 'store_product')
+
+    def test_reviews_of_a_product_by_date(self, api_client, capture):
+        product = baker.make(Product, quantity=1)
+        baker.make(Review, product=product, _quantity=3)
+
+        with capture:
+            api_client.get(f'/store/products/{product.id}/reviews/', {'ordering': '-created_at'})
+
+        assert_indexed(capture.captured_queries, 'store_review')
+
+    def test_orders_of_a_customer_by_date(self, api_client, capture):
+        user = baker.make(settings.AUTH_USER_MODEL)
+        baker.make(Order, customer=user.customer, _quantity=12)
+        api_client.force_authenticate(user=user)
+        next_page = api_client.get('/store/orders/').data['next']
+
+        # The order history customers page through, seeking on placed_at
+        with capture:
+            api_client.get('/store/orders/')
+            api_client.get(next_page)
+
+        assert_indexed(capture.captured_queries, 'store_order')
+
+    def test_abandoned_carts_by_age(self, capture):
+        baker.make(Cart, _quantity=3)
+
+        with capture:
+            list(Cart.objects.filter(created_at__lt=timezone.now() - timedelta(days=30)))
+
+        assert_indexed(capture.captured_queries, 'store_cart')
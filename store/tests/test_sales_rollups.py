@@ -0,0 +1,242 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from io import StringIO
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from rest_framework import status
+from rest_framework.test import APIClient
+from store import outbox
+from store.models import (
+    Collection, CollectionSalesDay, CustomerSales, Order, OrderItem, OutboxEvent, Product,
+    ProductSalesDay)
+from model_bakery import baker
+import pytest
+
+
+def rollup_rows():
+    return (
+        sorted(ProductSalesDay.objects.values_list(
+            'day', 'product_id', 'payment_status', 'units', 'revenue')),
+        sorted(CollectionSalesDay.objects.values_list(
+            'day', 'collection_id', 'payment_status', 'units', 'revenue')),
+        sorted(CustomerSales.objects.values_list(
+            'customer_id', 'payment_status', 'orders', 'revenue')),
+    )
+
+
+def dispatch_outbox():
+    call_command('dispatch_outbox', once=True, workers=1, stdout=StringIO())
+
+
+def backfill(**options):
+    out = StringIO()
+    call_command('backfill_sales_rollups', stdout=out, **options)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+class TestIncrementalRollups:
+    @pytest.fixture(autouse=True)
+    def setup(self, api_client):
+        self.collections = baker.make(Collection, _quantity=2)
+        self.mug = baker.make(Product, collection=self.collections[0],
+                              unit_price=Decimal('4.00'), quantity=100)
+        self.cup = baker.make(Product, collection=self.collections[1],
+                              unit_price=Decimal('2.50'), quantity=100)
+        self.user = baker.make(settings.AUTH_USER_MODEL)
+        api_client.force_authenticate(user=self.user)
+
+    def checkout(self, api_client, mugs, cups):
+        cart_id = api_client.post('/store/carts/').data['id']
+        items = [{'product_id': product.id, 'quantity': quantity}
+                 for product, quantity in ((self.mug, mugs), (self.cup, cups)) if quantity]
+        api_client.post(f'/store/carts/{cart_id}/items/batch/', items, format='json')
+        return api_client.post('/store/orders/', {'cart_id': cart_id}).data['id']
+
+    def test_checkout_leaves_the_rollups_to_the_outbox(self, api_client):
+        self.checkout(api_client, mugs=2, cups=1)
+
+        assert rollup_rows() == ([], [], [])
+        event = OutboxEvent.objects.get(topic='sales_rollup')
+        assert event.payload['payment_status'] == 'P'
+
+    def test_checkouts_add_to_the_rollups(self, api_client):
+        self.checkout(api_client, mugs=2, cups=1)
+        order_id = self.checkout(api_client, mugs=1, cups=4)
+        dispatch_outbox()
+
+        day = Order.objects.get(pk=order_id).placed_at.date()
+        customer_id = self.user.customer.id
+        assert rollup_rows() == (
+            sorted([(day, self.mug.id, 'P', 3, Decimal('12.00')),
+                    (day, self.cup.id, 'P', 5, Decimal('12.50'))]),
+            sorted([(day, self.collections[0].id, 'P', 3, Decimal('12.00')),
+                    (day, self.collections[1].id, 'P', 5, Decimal('12.50'))]),
+            [(customer_id, 'P', 2, Decimal('24.50'))],
+        )
+
+    def test_payment_status_changes_move_the_order(self, api_client, authenticate_user):
+        self.checkout(api_client, mugs=2, cups=1)
+        order_id = self.checkout(api_client, mugs=1, cups=0)
+        dispatch_outbox()
+        authenticate_user(is_staff=True)
+
+        api_client.patch(f'/store/orders/{order_id}/', {'payment_status': 'C'})
+
+        day = Order.objects.get(pk=order_id).placed_at.date()
+        products, _, customers = rollup_rows()
+        assert products == sorted([
+            (day, self.mug.id, 'C', 1, Decimal('4.00')),
+            (day, self.mug.id, 'P', 2, Decimal('8.00')),
+            (day, self.cup.id, 'P', 1, Decimal('2.50'))])
+        assert customers == sorted([
+            (self.user.customer.id, 'C', 1, Decimal('4.00')),
+            (self.user.customer.id, 'P', 1, Decimal('10.50'))])
+
+    def test_status_changes_before_the_rollup_net_out(self, api_client):
+        order_id = self.checkout(api_client, mugs=2, cups=0)
+        order = Order.objects.get(pk=order_id)
+        order.payment_status = Order.PAYMENT_COMPLETE
+        order.save()
+
+        dispatch_outbox()
+
+        assert [row[2:4] for row in rollup_rows()[0]] == [('C', 2), ('P', 0)]
+
+    def test_redelivered_events_are_counted_once(self, api_client):
+        self.checkout(api_client, mugs=2, cups=0)
+        event = OutboxEvent.objects.get(topic='sales_rollup')
+
+        # A second worker picking the event up after the first one's lease ran out
+        assert outbox.dispatch(event) is None
+        assert outbox.dispatch(event) is None
+
+        assert [row[3] for row in rollup_rows()[0]] == [2]
+
+    def test_backfill_agrees_with_the_incremental_rollups(self, api_client):
+        self.checkout(api_client, mugs=2, cups=1)
+        order_id = self.checkout(api_client, mugs=1, cups=3)
+        order = Order.objects.get(pk=order_id)
+        order.payment_status = Order.PAYMENT_FAILED
+        order.save()
+        dispatch_outbox()
+        incremental = rollup_rows()
+
+        backfill()
+
+        assert rollup_rows() == incremental
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_status_changes_move_the_order_once():
+    if connection.vendor == 'sqlite':
+        # Without row locks, a transaction that reads before it writes can't
+        # wait for the write lock and fails with "database is locked"
+        pytest.skip('SQLite has no row locks to make concurrent writers wait')
+    workers = 4
+    product = baker.make(Product, unit_price=Decimal('5.00'))
+    order = baker.make(Order, customer=baker.make(settings.AUTH_USER_MODEL).customer)
+    baker.make(OrderItem, order=order, product=product, quantity=2, unit_price=Decimal('5.00'))
+    backfill()
+    staff = baker.make(settings.AUTH_USER_MODEL, is_staff=True)
+    barrier = threading.Barrier(workers)
+
+    def complete(_):
+        client = APIClient()
+        client.force_authenticate(user=staff)
+        try:
+            barrier.wait()
+            return client.patch(f'/store/orders/{order.id}/', {'payment_status': 'C'}).status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        assert set(executor.map(complete, range(workers))) == {status.HTTP_200_OK}
+
+    assert sorted(ProductSalesDay.objects.values_list('payment_status', 'units')) == [
+        ('C', 2), ('P', 0)]
+
+
+@pytest.mark.django_db
+class TestBackfill:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.product = baker.make(Product, unit_price=Decimal('3.00'))
+        self.customer = baker.make(settings.AUTH_USER_MODEL).customer
+        for day in (1, 2, 20):
+            order = baker.make(Order, customer=self.customer, payment_status='C')
+            Order.objects.filter(pk=order.pk).update(
+                placed_at=datetime(2026, 9, day, 12, tzinfo=timezone.utc))
+            baker.make(OrderItem, order=order, product=self.product,
+                       quantity=day, unit_price=Decimal('3.00'))
+
+    def test_rebuilds_history_in_batches(self):
+        output = backfill(batch_days=7, batch_size=1, verbosity=2)
+
+        products, collections, customers = rollup_rows()
+        assert products == [
+            (date(2026, 9, 1), self.product.id, 'C', 1, Decimal('3.00')),
+            (date(2026, 9, 2), self.product.id, 'C', 2, Decimal('6.00')),
+            (date(2026, 9, 20), self.product.id, 'C', 20, Decimal('60.00'))]
+        assert [row[3] for row in collections] == [1, 2, 20]
+        assert customers == [(self.customer.id, 'C', 3, Decimal('69.00'))]
+        assert '2026-09-15 to 2026-09-21: 1 product rows.' in output
+        assert 'Rebuilt 3 product rows and 1 customer rows' in output
+
+    def test_refuses_to_run_before_pending_rollups_are_recorded(self):
+        outbox.publish('sales_rollup', order_ids=[0], payment_status='P')
+
+        with pytest.raises(CommandError, match='1 sales_rollup events are pending'):
+            backfill()
+
+        assert rollup_rows() == ([], [], [])
+
+    def test_running_again_replaces_the_rows(self):
+        backfill()
+        ProductSalesDay.objects.update(units=0)
+
+        backfill(batch_days=1)
+
+        assert [row[3] for row in rollup_rows()[0]] == [1, 2, 20]
+
+
+@pytest.mark.django_db
+class TestSalesReports:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.products = baker.make(Product, _quantity=2)
+        for day in (1, 2, 3):
+            for product in self.products:
+                baker.make(ProductSalesDay, day=date(2026, 10, day), product=product,
+                           payment_status='C', units=day, revenue=Decimal(day))
+
+    def test_returns_403_if_user_is_not_staff(self, api_client, authenticate_user):
+        authenticate_user(is_staff=False)
+
+        response = api_client.get('/store/reports/products/')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_filters_by_day_and_product(self, api_client, authenticate_user):
+        authenticate_user(is_staff=True)
+
+        response = api_client.get('/store/reports/products/', {
+            'day__gte': '2026-10-02', 'product': self.products[1].id})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [(row['day'], row['units']) for row in response.data['results']] == [
+            ('2026-10-03', 3), ('2026-10-02', 2)]
+
+    def test_reads_the_rows_without_touching_orders(
+            self, api_client, authenticate_user, django_assert_num_queries):
+        authenticate_user(is_staff=True)
+
+        # The count and the page
+        with django_assert_num_queries(2) as captured:
+            response = api_client.get('/store/reports/products/', {'page_size': 500})
+
+        assert len(response.data['results']) == 6
+        assert not any('store_order' in query['sql'] for query in captured.captured_queries)
@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from store.models import Cart, CartItem, Collection, Order, OrderItem, Product, Promotion
+from model_bakery import baker
+import pytest
+
+
+@pytest.fixture
+def capture_queries():
+    return CaptureQueriesContext(connection)
+
+
+@pytest.mark.django_db
+class TestProductFields:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.product = baker.make(Product, collection=baker.make(Collection))
+        self.product.promotion.set(baker.make(Promotion, _quantity=2))
+
+    @pytest.mark.parametrize('values_serializer', [True, False])
+    def test_only_selected_fields_are_loaded(self, api_client, settings, capture_queries, values_serializer):
+        settings.STORE_PRODUCT_VALUES_SERIALIZER = values_serializer
+
+        with capture_queries:
+            response = api_client.get('/store/products/', {'fields': 'id,title,price'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.data['results'][0]) == ['id', 'title', 'price']
+        sql = ' '.join(query['sql'] for query in capture_queries.captured_queries)
+        assert 'description' not in sql
+        assert 'store_collection' not in sql
+        assert 'store_product_promotion' not in sql
+
+    @pytest.mark.parametrize('values_serializer', [True, False])
+    def test_omit_excludes_fields(self, api_client, settings, values_serializer):
+        settings.STORE_PRODUCT_VALUES_SERIALIZER = values_serializer
+
+        response = api_client.get(
+            f'/store/products/{self.product.id}/', {'omit': 'description,promotion'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert list(response.data) == [
+            'id', 'title', 'price', 'price_with_tax', 'effective_price', 'quantity',
+            'collection']
+        assert response.data['collection']['id'] == self.product.collection_id
+
+    def test_selected_relations_are_loaded(self, api_client, settings):
+        settings.STORE_PRODUCT_VALUES_SERIALIZER = False
+
+        response = api_client.get(
+            f'/store/products/{self.product.id}/', {'fields': 'promotion,collection'})
+
+        assert sorted(response.data['promotion']) == sorted(
+            self.product.promotion.values_list('id', flat=True))
+        assert response.data['collection']['name'] == self.product.collection.name
+
+    def test_unknown_field_returns_400(self, api_client):
+        response = api_client.get('/store/products/', {'fields': 'id,secret'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'secret' in str(response.data['fields'])
+
+
+@pytest.mark.django_db
+class TestOtherEndpointFields:
+    def test_collection_fields(self, api_client):
+        baker.make(Collection)
+
+        response = api_client.get('/store/collections/', {'omit': 'products_count'})
+
+        assert list(response.data[0]) == ['id', 'name']
+
+    def test_cart_without_items_skips_the_prefetch(self, api_client, settings, capture_queries):
+        settings.STORE_CART_STORE = 'store.carts.DatabaseCartStore'
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=baker.make(Product), quantity=1)
+
+        with capture_queries:
+            response = api_client.get(f'/store/carts/{cart.id}/', {'fields': 'id,created_at'})
+
+        assert list(response.data) == ['id', 'created_at']
+        assert len(capture_queries.captured_queries) == 1
+
+    def test_cart_item_fields(self, api_client, settings):
+        settings.STORE_CART_STORE = 'store.carts.DatabaseCartStore'
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=baker.make(Product, unit_price=2), quantity=3)
+
+        response = api_client.get(
+            f'/store/carts/{cart.id}/items/', {'fields': 'quantity,total_price'})
+
+        assert response.data == [{'quantity': 3, 'total_price': 6}]
+
+    def test_order_fields(self, api_client):
+        user = baker.make(settings.AUTH_USER_MODEL, is_staff=True)
+        order = baker.make(Order, customer=user.customer)
+        baker.make(OrderItem, order=order, product=baker.make(Product), quantity=1)
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get('/store/orders/', {'fields': 'id,payment_status'})
+
+        assert list(response.data['results'][0]) == ['id', 'payment_status']
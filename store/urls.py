@@ -7,6 +7,9 @@ router.register('products', views.ProductViewSet, basename='products')
 router.register('customers', views.CustomerViewSet)
 router.register('carts', views.CartViewSet)
 router.register('orders', views.OrderViewSet, basename='orders')
+router.register('reports/products', views.ProductSalesViewSet, basename='product-sales')
+router.register('reports/collections', views.CollectionSalesViewSet, basename='collection-sales')
+router.register('reports/customers', views.CustomerSalesViewSet, basename='customer-sales')
 
 products_router = routers.NestedDefaultRouter(
     router, 'products', lookup='product'
@@ -1,45 +1,216 @@
-from django.db.models.aggregates import Count
+from uuid import UUID
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch, ProtectedError
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin
-from rest_framework.viewsets import ModelViewSet, GenericViewSet
+from rest_framework.viewsets import ModelViewSet, GenericViewSet, ReadOnlyModelViewSet
 from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Collection, Product, Customer, Review, Cart, CartItem, Order, ProductImage
-from .pagination import CustomPagination
-from .filters import ProductFilter
+from .models import Collection, Product, Customer, Review, Cart, CartItem, Order, ProductImage, \
+    ProductSalesDay, CollectionSalesDay, CustomerSales
+from .pagination import CustomPagination, KeysetPagination, OrderPagination, ReportPagination
+from .customers import get_customer_id
+from .filters import ProductFilter, ProductSearchFilter
 from .permissions import IsAdminOrReadOnly, ViewCustomerHistoryPermission
+from .cache import VersionedCacheMixin, COLLECTIONS, PRODUCTS, CATALOG, product_namespace, make_key, make_keys, get_timeout
+from .conditional import ConditionalResponseMixin
+from .facets import compute_facets
+from .fieldsets import SparseFieldsetsMixin
+from .carts import get_cart_store
+from .bulk import EXPORT_FIELDS, ProductImporter, export_products, write_product_batch, get_row_context
+from .exports import ORDER_EXPORT_FIELDS, export_orders
+from . import idempotency, streaming
 from . import serializers
 
 
-@method_decorator(cache_page(5*60), name='dispatch')
-class CollectionViewSet(ModelViewSet):
-    queryset = Collection.objects.annotate(
-        products_count=Count('product')
-    )
+class CollectionViewSet(VersionedCacheMixin, SparseFieldsetsMixin, ModelViewSet):
+    queryset = Collection.objects.all()
     serializer_class = serializers.CollectionSerializer
     filter_backends = [OrderingFilter]
     ordering_fields = ['id', 'products_count']
     permission_classes = [IsAdminOrReadOnly]
+    sparse_field_sources = {
+        'id': ['id'],
+        'name': ['name'],
+        'products_count': ['products_count'],
+    }
 
+    def get_cache_namespaces(self):
+        return (COLLECTIONS,)
 
-@method_decorator(cache_page(5*60), name='dispatch')
-class ProductViewSet(ModelViewSet):
+
+class ProductViewSet(ConditionalResponseMixin, VersionedCacheMixin, SparseFieldsetsMixin, ModelViewSet):
     queryset = Product.objects.select_related(
         'collection').prefetch_related('promotion')
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend,
+                       ProductSearchFilter, OrderingFilter]
     pagination_class = CustomPagination
+    cursor_pagination_class = KeysetPagination
     ordering_fields = ['id', 'title', 'unit_price',
-                       'quantity']
+                       'effective_price', 'quantity']
     permission_classes = [IsAdminOrReadOnly]
     filterset_class = ProductFilter
+    sparse_field_sources = {
+        'id': ['id'],
+        'title': ['title'],
+        'description': ['description'],
+        'price': ['unit_price'],
+        'price_with_tax': ['unit_price'],
+        'effective_price': ['effective_price'],
+        'quantity': ['quantity'],
+        'promotion': [],
+        'collection': ['collection__name'],
+    }
+    sparse_field_prefetches = {
+        'promotion': ['promotion'],
+    }
+
+    @property
+    def paginator(self):
+        # Passing `?cursor=` (empty for the first page) switches the listing
+        # to keyset pagination, which skips the COUNT(*) and OFFSET scan.
+        if not hasattr(self, '_paginator'):
+            if self.cursor_pagination_class.cursor_query_param in self.request.query_params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_cache_namespaces(self):
+        if self.action == 'retrieve':
+            pk = self.kwargs['pk']
+            return (CATALOG, product_namespace(int(pk) if pk.isdigit() else pk))
+        return (PRODUCTS,)
+
+    # Query parameters that don't change which products match
+    facets_ignored_params = {'page', 'cursor', 'ordering', 'facets'}
+
+    # `?ids=1,2,3` returns those products instead of a page
+    ids_param = 'ids'
+    max_ids = 100
+    # Ids past the 64-bit range of the primary key overflow the database
+    # driver, smaller unknown ones just match nothing
+    max_id = 2 ** 63 - 1
+
+    def list(self, request, *args, **kwargs):
+        if self.ids_param in request.query_params:
+            return self.list_by_ids(self.get_ids())
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK \
+                and request.query_params.get('facets') in ('1', 'true'):
+            # The page may be shared with the cache, so don't mutate it
+            response.data = {**response.data, 'facets': self.get_facets()}
+        return response
+
+    def get_ids(self):
+        value = self.request.query_params[self.ids_param]
+        try:
+            ids = [int(pk) for pk in value.split(',') if pk.strip()]
+            if any(abs(pk) > self.max_id for pk in ids):
+                raise ValueError
+        except ValueError:
+            raise ValidationError({self.ids_param: 'Expected comma separated product ids.'})
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > self.max_ids:
+            raise ValidationError(
+                {self.ids_param: f'Ensure there are no more than {self.max_ids} ids.'})
+        return ids
+
+    def list_by_ids(self, ids):
+        """
+        Return the given products in order, skipping unknown ids.
+
+        Each product is cached on its own, under the same namespaces as
+        `retrieve`, so only the misses are loaded, in a single query.
+        """
+        fields = self.get_sparse_fields()
+        keys = dict(zip(ids, make_keys(
+            'product-item', [(CATALOG, product_namespace(pk)) for pk in ids], fields)))
+        found = cache.get_many(list(keys.values()))
+        products = {pk: found[key] for pk, key in keys.items() if key in found}
+
+        missing = [pk for pk in ids if pk not in products]
+        if missing:
+            rows = list(self.get_queryset().filter(pk__in=missing))
+            data = self.get_serializer(rows, many=True).data
+            loaded = {
+                row['id'] if isinstance(row, dict) else row.pk: dict(item)
+                for row, item in zip(rows, data)
+            }
+            cache.set_many({keys[pk]: item for pk, item in loaded.items()}, get_timeout())
+            products.update(loaded)
+
+        return Response([products[pk] for pk in ids if pk in products])
+
+    def get_facets(self):
+        # The sparse fieldset parameters only pick what a product renders
+        ignored = self.facets_ignored_params | {self.fields_param, self.omit_param}
+        filters = sorted(
+            (name, values) for name, values in self.request.query_params.lists()
+            if name not in ignored)
+        key = make_key('product-facets', (PRODUCTS,), filters)
+        return cache.get_or_set(
+            key,
+            lambda: compute_facets(self.filter_queryset(self.get_queryset())),
+            get_timeout())
+
+    @action(detail=False, permission_classes=[IsAdminUser])
+    def export(self, request):
+        file_format = request.query_params.get('file_format', streaming.CSV)
+        if file_format not in streaming.FORMATS:
+            raise ValidationError(
+                {'file_format': f'Expected one of: {", ".join(streaming.FORMATS)}.'})
+        return streaming.streaming_response(
+            EXPORT_FIELDS, export_products(), file_format, 'products')
+
+    @action(detail=False, methods=['POST'], url_path='import',
+            permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+    def import_products(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'No file was submitted.'})
+        file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1]
+        if file_format not in streaming.FORMATS:
+            raise ValidationError(
+                {'file_format': f'Expected one of: {", ".join(streaming.FORMATS)}.'})
+
+        rows = streaming.decode(upload, file_format, list_fields=['promotion'])
+        return Response(ProductImporter().run(rows))
+
+    @action(detail=False, methods=['POST'], permission_classes=[IsAdminUser])
+    def batch(self, request):
+        serializer = serializers.ProductBatchSerializer(
+            data=request.data, context=get_row_context())
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = write_product_batch(**serializer.validated_data)
+        except ProtectedError:
+            raise ValidationError(
+                {'delete': 'Products referenced by orders cannot be deleted.'})
+        return Response(result)
+
+    def use_values_serializer(self):
+        return (self.action in ('list', 'retrieve')
+                and getattr(settings, 'STORE_PRODUCT_VALUES_SERIALIZER', False))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.use_values_serializer():
+            return serializers.ProductValuesSerializer.get_queryset(
+                queryset, self.get_sparse_fields(), extra=self.ordering_fields)
+        return queryset
 
     def get_serializer_class(self):
+        if self.use_values_serializer():
+            return serializers.ProductValuesSerializer
         if self.request.method == 'GET':
             return serializers.ProductReadSerializer
         return serializers.ProductWriteSerializer
@@ -129,11 +300,63 @@ class ReviewViewSet(ModelViewSet):
         return Response(serializer.data)
 
 
-class CartItemViewSet(ModelViewSet):
+def parse_cart_id(value):
+    try:
+        return UUID(str(value))
+    except ValueError:
+        raise Http404
+
+
+class CartItemViewSet(SparseFieldsetsMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
+    sparse_field_sources = {
+        'id': ['id'],
+        'product': ['product__title', 'product__description', 'product__unit_price'],
+        'quantity': ['quantity'],
+        'total_price': [],
+    }
+
+    def get_cart_id(self):
+        return parse_cart_id(self.kwargs['cart_pk'])
 
     def get_queryset(self):
-        return CartItem.objects.filter(cart_id=self.kwargs['cart_pk']).select_related('product')
+        # Only read by the database store, see `store.carts`
+        return self.apply_sparse_fields(CartItem.objects.filter(
+            cart_id=self.get_cart_id()).select_related('product').with_total_price())
+
+    def list(self, request, *args, **kwargs):
+        items = get_cart_store().get_items(self.get_cart_id(), self.get_queryset())
+        return Response(self.get_serializer(items, many=True).data)
+
+    @action(detail=False, methods=['POST'])
+    def batch(self, request, *args, **kwargs):
+        # A bare list is read as the items to add
+        data = {'items': request.data} if isinstance(request.data, list) else request.data
+        serializer = serializers.CartItemBatchSerializer(
+            data=data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        return Response(serializers.CartSerializer(serializer.save()).data)
+
+    def get_object(self):
+        try:
+            item_id = int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+        item = get_cart_store().get_item(self.get_cart_id(), item_id, self.get_queryset())
+        if item is None:
+            raise Http404
+        return item
+
+    def perform_update(self, serializer):
+        if 'quantity' in serializer.validated_data:
+            serializer.instance = get_cart_store().update_item(
+                self.get_cart_id(), serializer.instance.id,
+                serializer.validated_data['quantity'])
+            if serializer.instance is None:
+                raise Http404
+
+    def perform_destroy(self, instance):
+        get_cart_store().delete_item(self.get_cart_id(), instance.id)
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -143,24 +366,77 @@ class CartItemViewSet(ModelViewSet):
         return serializers.CartItemSerializer
 
     def get_serializer_context(self):
-        return {'cart_id': self.kwargs['cart_pk']}
+        return {'cart_id': self.get_cart_id()}
 
 
-class CartViewSet(CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
-    queryset = Cart.objects.prefetch_related('items__product').all()
+class CartViewSet(SparseFieldsetsMixin, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet):
+    queryset = Cart.objects.prefetch_related(Prefetch(
+        'items', CartItem.objects.select_related('product').with_total_price())).all()
     serializer_class = serializers.CartSerializer
-
-
-class OrderViewSet(ModelViewSet):
+    sparse_field_sources = {
+        'id': ['id'],
+        'items': [],
+        'created_at': ['created_at'],
+        # Read from `store.carts.get_cart_total`
+        'total_price': [],
+    }
+    sparse_field_prefetches = {
+        'items': [Prefetch(
+            'items', CartItem.objects.select_related('product').with_total_price())],
+    }
+
+    def get_object(self):
+        cart = get_cart_store().get_cart(
+            parse_cart_id(self.kwargs['pk']), self.get_queryset())
+        if cart is None:
+            raise Http404
+        return cart
+
+    def perform_create(self, serializer):
+        serializer.instance = get_cart_store().create_cart()
+
+    def perform_destroy(self, instance):
+        get_cart_store().delete_cart(instance.pk)
+
+
+class OrderViewSet(SparseFieldsetsMixin, ModelViewSet):
     http_method_names = ['get', 'patch', 'post', 'delete', 'head', 'options']
-    pagination_class = CustomPagination
+    pagination_class = OrderPagination
+    # Kept by sparse fieldsets, the pagination cursor reads them
+    ordering_fields = ['placed_at']
+    sparse_field_sources = {
+        'id': ['id'],
+        'customer': ['customer'],
+        'payment_status': ['payment_status'],
+        'items': [],
+        'placed_at': ['placed_at'],
+    }
+    sparse_field_prefetches = {
+        'items': ['items__product'],
+    }
 
     def get_permissions(self):
-        if self.request.method in ['PATCH', 'DELETE']:
+        if self.request.method in ['PATCH', 'DELETE'] or self.action == 'export':
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    @action(detail=False)
+    def export(self, request):
+        params = serializers.OrderExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = dict(params.validated_data)
+        file_format = filters.pop('file_format')
+        return streaming.streaming_response(
+            ORDER_EXPORT_FIELDS, export_orders(**filters), file_format, 'orders')
+
     def create(self, request, *args, **kwargs):
+        key = request.headers.get(idempotency.HEADER)
+        if key is None:
+            return self.create_order(request)
+        return idempotency.respond_once(
+            request.user.id, key, request.data, lambda: self.create_order(request))
+
+    def create_order(self, request):
         serializer = serializers.OrderCreationSerializer(
             data=request.data,
             context={'user_id': self.request.user.id})
@@ -170,15 +446,11 @@ class OrderViewSet(ModelViewSet):
         return Response(serializer.data)
 
     def get_queryset(self):
-        current_user = self.request.user
-        order_customer_id = Customer.objects.only(
-            'id').get(user_id=current_user.id)
-
-        if current_user.is_staff:
-            return Order.objects.prefetch_related('items__product').all()
-        elif current_user.id == order_customer_id:
-            return Order.objects.prefetch_related('items__product').filter(customer_id=order_customer_id)
-        return Order.objects.prefetch_related('items__product').all()
+        queryset = Order.objects.prefetch_related('items__product')
+        if not self.request.user.is_staff:
+            # No customer means no orders
+            queryset = queryset.filter(customer_id=get_customer_id(self.request.user.id))
+        return self.apply_sparse_fields(queryset)
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -186,3 +458,30 @@ class OrderViewSet(ModelViewSet):
         elif self.request.method == 'PATCH':
             return serializers.OrderUpdateSerializer
         return serializers.OrderSerializer
+
+
+class ProductSalesViewSet(ReadOnlyModelViewSet):
+    queryset = ProductSalesDay.objects.order_by('-day', 'product_id', 'payment_status')
+    serializer_class = serializers.ProductSalesDaySerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = ReportPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {'day': ['gte', 'lte'], 'product': ['exact'], 'payment_status': ['exact']}
+
+
+class CollectionSalesViewSet(ReadOnlyModelViewSet):
+    queryset = CollectionSalesDay.objects.order_by('-day', 'collection_id', 'payment_status')
+    serializer_class = serializers.CollectionSalesDaySerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = ReportPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {'day': ['gte', 'lte'], 'collection': ['exact'], 'payment_status': ['exact']}
+
+
+class CustomerSalesViewSet(ReadOnlyModelViewSet):
+    queryset = CustomerSales.objects.order_by('-revenue', 'customer_id', 'payment_status')
+    serializer_class = serializers.CustomerSalesSerializer
+    permission_classes = [IsAdminUser]
+    pagination_class = ReportPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = {'customer': ['exact'], 'payment_status': ['exact']}